@@ -1,26 +1,42 @@
 import streamlit as st
 import sqlite3
-import google.generativeai as genai
-from dotenv import load_dotenv
 import os
-import re
-import csv
-from io import StringIO
-
-# Load environment variables
-load_dotenv()
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=GOOGLE_API_KEY)
+import time
+from generator import serve_questions, serve_batch_questions
+from exporter import export_to_csv, export_to_gzip, export_to_zip
+from question_store import question_store
+from question_bank import init_bank, fetch_bank_stats, sample_quiz
+from jobs import init_jobs, enqueue_job, fetch_job, cancel_job, JOB_POLL_SECONDS
+from cancellation import CancelToken, GenerationCancelled
+from prewarm import get_prewarm_worker
+from profiling import rerun_profiler
+from hedging import CircuitOpen, breaker
+from users import init_users, authenticate, create_user, fetch_user, fetch_users, fetch_usage, QuotaExceeded
 
 # Initialize session state variables
 if "authenticated" not in st.session_state:
     st.session_state.authenticated = False
 
-if "generated_questions" not in st.session_state:
-    st.session_state.generated_questions = []
+# Sessions keep only question IDs; the payloads live in question_store
+if "generated_question_ids" not in st.session_state:
+    st.session_state.generated_question_ids = []
     
-if 'selected_questions' not in st.session_state:
-    st.session_state.selected_questions = []
+if 'selected_question_ids' not in st.session_state:
+    st.session_state.selected_question_ids = []
+
+if "pending_job_id" not in st.session_state:
+    st.session_state.pending_job_id = None
+
+# Subject and level of the pending job, to cancel it when they change
+if "pending_job_inputs" not in st.session_state:
+    st.session_state.pending_job_inputs = None
+
+# Token of this session's latest generation request
+if "cancel_token" not in st.session_state:
+    st.session_state.cancel_token = None
+
+if "job_error" not in st.session_state:
+    st.session_state.job_error = None
     
 if 'selected_subject' not in st.session_state:
     st.session_state.selected_subject = None
@@ -34,20 +50,39 @@ def login():
     username = st.text_input("Username")
     password = st.text_input("Password", type="password")
     if st.button("Login"):
-        if username == "admin" and password == "1234":
+        user = authenticate(username, password)
+        if user:
             st.session_state.authenticated = True
+            st.session_state.username = user["username"]
+            st.session_state.is_admin = user["is_admin"]
             st.success("Logged in successfully!")
-            st.experimental_rerun()  # Redirect to the main page after login
+            st.rerun()  # Redirect to the main page after login
         else:
             st.error("Invalid username or password")
 
+# Replace the question IDs held under a session key, moving the store references along
+def set_question_ids(key, ids, acquired=False):
+    if not acquired:
+        question_store.acquire(ids)
+    question_store.release(st.session_state[key])
+    st.session_state[key] = ids
+
+# Show newly generated questions; the store takes the session's reference as it
+# adds them, so a store full of stale sessions can't evict them straight away.
+# Identical questions share a store ID (and so a checkbox key): show each once.
+def show_generated_questions(questions):
+    unique = list(dict.fromkeys(questions))
+    set_question_ids("generated_question_ids", question_store.add(unique, acquire=True), acquired=True)
+
 # Function to handle logout
 def logout():
     st.session_state.authenticated = False
-    st.session_state.generated_questions = []
-    st.session_state.selected_questions = []
+    st.session_state.is_admin = False
+    set_question_ids("generated_question_ids", [])
+    set_question_ids("selected_question_ids", [])
+    cancel_generation()
     st.success("Logged out successfully!")
-    st.experimental_rerun()  # Redirect to the login page by rerunning the app
+    st.rerun()  # Redirect to the login page by rerunning the app
 
 # Database setup
 def init_db():
@@ -102,279 +137,363 @@ def fetch_levels():
     conn.close()
     return levels
 
-# Function to generate questions
-def generate_questions(subject, number, level, question_type):
-    difficulty_mapping = {
-        "Bronze": "basic",
-        "Silver": "intermediate",
-        "Gold": "advanced",
-        "Platinum": "expert",
-        "Diamond": "most difficult"
-    }
-    difficulty = difficulty_mapping.get(level, "basic")
-    
-    if question_type == "MCQs":
-        prompt = f"Generate {number} multiple choice questions for the subject '{subject}' at a {difficulty} level in this format:\n\n" \
-                 f"1. Question?\n" \
-                 f"a) Option 1\n" \
-                 f"b) Option 2\n" \
-                 f"c) Option 3\n" \
-                 f"d) Option 4\n\n" \
-                 f"Correct Answer: [Option]\n\n"
-    elif question_type == "True/False":
-        prompt = f"Generate {number} true/false questions for the subject '{subject}' at a {difficulty} level in this format:\n\n" \
-                 f"1. Question?\n" \
-                 f"Correct Answer: [True/False]\n\n"
-    elif question_type == "Multiple Correct Answers":
-        prompt = f"Generate {number} questions with multiple correct answers for the subject '{subject}' at a {difficulty} level in this format:\n\n" \
-                 f"1. Question?\n" \
-                 f"a) Option 1\n" \
-                 f"b) Option 2\n" \
-                 f"c) Option 3\n" \
-                 f"d) Option 4\n\n" \
-                 f"Correct Answers: [Option1, Option2]\n\n"
-    
-    response = genai.GenerativeModel('gemini-1.5-flash').generate_content(prompt)
-    return response.text.strip()
-
-# Parsing function with refined output
-def parse_questions(questions_text, question_type):
-    if question_type == "MCQs":
-        question_pattern = r'(\d+\..+?)\s*(a\).+?)\s*(b\).+?)\s*(c\).+?)\s*(d\).+?)\s*Correct Answer: \[([a-d])\]'
-    elif question_type == "True/False":
-        question_pattern = r'(\d+\..+?)\s*Correct Answer: \[(True|False)\]'
-    elif question_type == "Multiple Correct Answers":
-        question_pattern = r'(\d+\..+?)\s*(a\).+?)\s*(b\).+?)\s*(c\).+?)\s*(d\).+?)\s*Correct Answers: \[([a-d, ]+)\]'
-    
-    questions = []
-    matches = re.findall(question_pattern, questions_text, re.DOTALL)
-
-    for match in matches:
-        if question_type == "MCQs":
-            question_text, option_a, option_b, option_c, option_d, correct_answer = match
-            clean_question = re.sub(r'^\d+\.\s*', '', question_text).strip()
-            clean_option_a = re.sub(r'^a\)\s*', '', option_a).strip()
-            clean_option_b = re.sub(r'^b\)\s*', '', option_b).strip()
-            clean_option_c = re.sub(r'^c\)\s*', '', option_c).strip()
-            clean_option_d = re.sub(r'^d\)\s*', '', option_d).strip()
-            questions.append({
-                "question": clean_question,
-                "options": {
-                    "a": clean_option_a,
-                    "b": clean_option_b,
-                    "c": clean_option_c,
-                    "d": clean_option_d
-                },
-                "correct_answer": correct_answer.strip()
-            })
-        elif question_type == "True/False":
-            question_text, correct_answer = match
-            clean_question = re.sub(r'^\d+\.\s*', '', question_text).strip()
-            questions.append({
-                "question": clean_question,
-                "correct_answer": correct_answer.strip()  # Store the correct answer
-            })
-        elif question_type == "Multiple Correct Answers":
-            question_text, option_a, option_b, option_c, option_d, correct_answers = match
-            clean_question = re.sub(r'^\d+\.\s*', '', question_text).strip()
-            clean_option_a = re.sub(r'^a\)\s*', '', option_a).strip()
-            clean_option_b = re.sub(r'^b\)\s*', '', option_b).strip()
-            clean_option_c = re.sub(r'^c\)\s*', '', option_c).strip()
-            clean_option_d = re.sub(r'^d\)\s*', '', option_d).strip()
-            correct_answers_list = [ans.strip() for ans in correct_answers.split(',')]
-            questions.append({
-                "question": clean_question,
-                "options": {
-                    "a": clean_option_a,
-                    "b": clean_option_b,
-                    "c": clean_option_c,
-                    "d": clean_option_d
-                },
-                "correct_answers": correct_answers_list
-            })
-
-    return questions
-
-
-# Export to CSV function with refined output
-def export_to_csv(selected_questions, subject, level):
-    csv_buffer = StringIO()
-    csv_writer = csv.writer(csv_buffer)
-
-    # Write header
-    csv_writer.writerow([
-        "Question Text", "Question Type", "Option 1", "Option 2",
-        "Option 3", "Option 4", "isCorrectOption1", "isCorrectOption2",
-        "isCorrectOption3", "isCorrectOption4", "Subject", "Level"
-    ])
-
-    # Write rows
-    for question in selected_questions:
-        if "correct_answers" in question:
-            # Handle Multiple Correct Answers
-            is_correct = {
-                "a": "a" in question["correct_answers"],
-                "b": "b" in question["correct_answers"],
-                "c": "c" in question["correct_answers"],
-                "d": "d" in question["correct_answers"]
-            }
-            csv_writer.writerow([
-                question["question"],
-                "Multiple Correct Answers",
-                question["options"].get("a", ""),
-                question["options"].get("b", ""),
-                question["options"].get("c", ""),
-                question["options"].get("d", ""),
-                is_correct["a"],
-                is_correct["b"],
-                is_correct["c"],
-                is_correct["d"],
-                subject,
-                level
-            ])
-        elif "options" in question:
-            # Handle MCQs
-            is_correct = {
-                "a": question["correct_answer"] == "a",
-                "b": question["correct_answer"] == "b",
-                "c": question["correct_answer"] == "c",
-                "d": question["correct_answer"] == "d"
-            }
-            csv_writer.writerow([
-                question["question"],
-                "MCQs",
-                question["options"].get("a", ""),
-                question["options"].get("b", ""),
-                question["options"].get("c", ""),
-                question["options"].get("d", ""),
-                is_correct["a"],
-                is_correct["b"],
-                is_correct["c"],
-                is_correct["d"],
-                subject,
-                level
-            ])
+# Storage setup runs once per process instead of on every rerun
+@st.cache_resource
+def init_storage():
+    init_db()
+    init_bank()
+    init_jobs()
+    init_users()
+    return get_prewarm_worker()
+
+# Shows the caller's place in the fair-share queue while generation waits for
+# a slot, then that it is running. Being called while the model works also
+# lets Streamlit stop this run when the user changes an input or reruns, which
+# cancels the in-flight call.
+def queue_notice(placeholder):
+    def notice(position):
+        if position:
+            placeholder.info(f"Waiting for a generation slot: position {position} in the queue...")
         else:
-            # Handle True/False
-            is_correct = question["correct_answer"] == "True"
-            csv_writer.writerow([
-                question["question"],
-                "True/False",
-                "",  # No options for True/False
-                "",  # No options for True/False
-                "",  # No options for True/False
-                "",  # No options for True/False
-                is_correct,  # Only one correct answer
-                "",  # No options for True/False
-                "",  # No options for True/False
-                "",  # No options for True/False
-                subject,
-                level
-            ])
-
-    csv_buffer.seek(0)
-    return csv_buffer.getvalue()
-# Initialize database
-init_db()
-
-# Main App
-if not st.session_state.authenticated:
-    login()
-else:
-    # Logout button
-    if st.button("Logout"):
-        logout()
-
-    # Main application
-    st.title("Question's Generator")
-
-    # Fetch existing data
-    subjects = fetch_subjects()
-    levels = fetch_levels()
-
-    # Question Type Input
-    question_type = st.selectbox("Select Question Type:", ["MCQs", "True/False", "Multiple Correct Answers"])
-
-    # Subject Input with Dynamic Dropdown and Save
-    selected_subject = st.selectbox("Subject (select or add new):", subjects + ["Add new..."])
-    if selected_subject == "Add new...":
-        new_subject = st.text_input("Enter new subject:", key="new_subject")
-        if new_subject:
-            if st.button("Save Subject", key="save_subject"):
-                insert_subject(new_subject)
-                st.success(f"Subject '{new_subject}' added successfully!")
-                st.experimental_rerun()
-
-    # Difficulty Level Input with Dynamic Dropdown and Save
-    selected_level = st.selectbox("Difficulty Level (select or add new):", levels + ["Add new..."])
-    if selected_level == "Add new...":
-        new_level = st.text_input("Enter new difficulty level:", key="new_level")
-        if new_level:
-            if st.button("Save Difficulty Level", key="save_level"):
-                insert_level(new_level)
-                st.success(f"Difficulty level '{new_level}' added successfully!")
-                st.experimental_rerun()
-
-    # Static Input for Number of Questions
-    number_of_questions = st.number_input("Number of Questions:", min_value=1, max_value=100, value=10)
-
-    # Generate Questions Button
-    if st.button("Generate Questions"):
-        if selected_subject and selected_level:
-            questions_text = generate_questions(selected_subject, number_of_questions, selected_level, question_type)
-            if questions_text:
-                st.session_state.generated_questions = parse_questions(questions_text, question_type)
-            else:
-                st.error("No questions generated. Please try again.")
+            placeholder.info("Generating questions... Changing the inputs or pressing Cancel stops it.")
+    return notice
+
+# Cancel whatever generation this session still has in flight or queued
+def cancel_generation():
+    if st.session_state.cancel_token is not None:
+        st.session_state.cancel_token.cancel()
+        st.session_state.cancel_token = None
+    if st.session_state.pending_job_id is not None:
+        cancel_job(st.session_state.pending_job_id)
+        st.session_state.pending_job_id = None
+        st.session_state.pending_job_inputs = None
+
+# A new request supersedes the previous one
+def start_generation():
+    cancel_generation()
+    st.session_state.cancel_token = CancelToken()
+    return st.session_state.cancel_token
+
+# Job status refreshes on its own timer without rerunning the page; the page
+# reruns once when the job finishes so its questions show up
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def job_status():
+    job_id = st.session_state.pending_job_id
+    if job_id is None:
+        return
+    status, questions, error = fetch_job(job_id)
+    if status == "done":
+        st.session_state.pending_job_id = None
+        if questions:
+            show_generated_questions(questions)
         else:
-            st.error("Please fill in both Subject and Difficulty Level.")
-
+            st.session_state.job_error = "No questions generated. Please try again."
+        st.rerun()
+    elif status == "cancelled":
+        st.session_state.pending_job_id = None
+        st.rerun()
+    elif status in ("failed", "missing"):
+        st.session_state.pending_job_id = None
+        st.session_state.job_error = f"Generation job failed: {error or 'job not found'}"
+        st.rerun()
+    else:
+        st.info(f"Generation job #{job_id} is {status}...")
+
+# Button callbacks: keep the checkboxes in step with the selection
+def select_all_questions(question_ids):
+    set_question_ids("selected_question_ids", list(question_ids))
+    for question_id in question_ids:
+        st.session_state[f"gen_q_{question_id}"] = True
+
+def clear_selection():
+    for question_id in st.session_state.selected_question_ids:
+        st.session_state[f"gen_q_{question_id}"] = False
+    set_question_ids("selected_question_ids", [])
+
+# Generated list, selection and export rerun on their own, so a checkbox click
+# doesn't re-execute the rest of the page
+@st.fragment
+def selection_area(selected_subject, selected_level):
+    with rerun_profiler.profile_rerun():
+        show_selection_area(selected_subject, selected_level)
+
+# Generated questions with their checkboxes, then the selection and its export
+def show_selection_area(selected_subject, selected_level):
     # Updated display for refined questions
-    if st.session_state.generated_questions:
+    generated_items = question_store.items(st.session_state.generated_question_ids)
+    if generated_items:
         st.write("### Generated Questions:")
-        for idx, question in enumerate(st.session_state.generated_questions):
+        for idx, (question_id, question) in enumerate(generated_items):
             # Checkbox to select/unselect the question
-            checkbox_key = f"gen_q_{idx}"
-            if st.checkbox(f"{idx + 1} . {question['question']}", key=checkbox_key):
-                if question not in st.session_state.selected_questions:
-                    st.session_state.selected_questions.append(question)
+            checkbox_key = f"gen_q_{question_id}"
+            if st.checkbox(f"{idx + 1} . {question.text}", key=checkbox_key):
+                if question_id not in st.session_state.selected_question_ids:
+                    question_store.acquire([question_id])
+                    st.session_state.selected_question_ids.append(question_id)
             else:
-                if question in st.session_state.selected_questions:
-                    st.session_state.selected_questions.remove(question)
+                if question_id in st.session_state.selected_question_ids:
+                    st.session_state.selected_question_ids.remove(question_id)
+                    question_store.release([question_id])
 
             # Display refined options for the generated question
-            if "options" in question:
-                for opt_key, option in question["options"].items():
-                    st.text(f"{opt_key}. {option}")
-            st.write(f"**Correct Answer: {question.get('correct_answer', question.get('correct_answers', []))}**")
-            
+            for opt_key, option in question.options:
+                st.text(f"{opt_key}. {option}")
+            st.write(f"**Correct Answer: {question.answer}**")
+
         # Button to select all generated questions
-        if st.button("Select All Questions"):
-            st.session_state.selected_questions = st.session_state.generated_questions.copy()
+        if st.button("Select All Questions", on_click=select_all_questions,
+                     args=([question_id for question_id, _ in generated_items],)):
             st.success("All questions have been selected.")
 
 
     # Display Selected Questions and Export to CSV
-    if st.session_state.selected_questions:
+    selected_questions = question_store.get(st.session_state.selected_question_ids)
+    if selected_questions:
         st.write("### Selected Questions:")
-        for idx, question in enumerate(st.session_state.selected_questions):
-            st.write(f"**{idx + 1}. {question['question']}**")
-            if "options" in question:
-                for opt_key, option in question["options"].items():
-                    st.text(f"{opt_key}. {option}")
-                st.write(f"**Correct Answer: {question.get('correct_answer', question.get('correct_answers', []))}**")
-            else:
-                # Display correct answer for True/False
-                st.write(f"**Correct Answer: {question['correct_answer']}**")  # Display the correct answer for True/False
-
-        # Export to CSV Button
-        csv_data = export_to_csv(st.session_state.selected_questions, selected_subject, selected_level)
+        for idx, question in enumerate(selected_questions):
+            st.write(f"**{idx + 1}. {question.text}**")
+            for opt_key, option in question.options:
+                st.text(f"{opt_key}. {option}")
+            st.write(f"**Correct Answer: {question.answer}**")
+
+        # Export Button; large selections compress well, so offer archives too
+        export_format = st.radio("Export format:", ["CSV", "ZIP (one file per question type)", "GZIP"], horizontal=True)
+        # Exam variants reshuffle question order and options locally, with no extra LLM calls
+        variant_count = st.number_input("Exam variants:", min_value=1, max_value=26, value=1)
+        variant_seed = st.number_input("Variant seed:", min_value=0, value=0) if variant_count > 1 else 0
+        if export_format == "CSV":
+            export_data = export_to_csv(selected_questions, selected_subject, selected_level, variant_count, variant_seed)
+            file_name, mime = "questions.csv", "text/csv"
+        elif export_format == "GZIP":
+            export_data = export_to_gzip(selected_questions, selected_subject, selected_level, variant_count, variant_seed)
+            file_name, mime = "questions.csv.gz", "application/gzip"
+        else:
+            export_data = export_to_zip(selected_questions, selected_subject, selected_level, variant_count, variant_seed)
+            file_name, mime = "questions.zip", "application/zip"
         if st.download_button(
-            label="Export to CSV",
-            data=csv_data,
-            file_name="questions.csv",
-            mime="text/csv"
+            label=f"Export to {export_format.split()[0]}",
+            data=export_data,
+            file_name=file_name,
+            mime=mime,
+            on_click=clear_selection  # Clear selected questions after download
             ):
-            # Clear selected questions after download
-            st.session_state.selected_questions = []
-            st.success("CSV downloaded successfully! The selected questions have been cleared.")
\ No newline at end of file
+            st.success("Export downloaded successfully! The selected questions have been cleared.")
+
+# The page itself, run once per rerun
+def main():
+    # Initialize database
+    prewarm_worker = init_storage()
+
+    # Main App
+    if not st.session_state.authenticated:
+        login()
+    else:
+        # Logout button
+        if st.button("Logout"):
+            logout()
+
+        # Quotas are re-read on every rerun so admin changes apply immediately
+        current_user = fetch_user(st.session_state.username)
+        used_questions, used_tokens = fetch_usage(current_user["username"])
+        st.sidebar.caption(
+            f"Today: {used_questions} questions / {used_tokens} tokens used "
+            f"(limits: {current_user['daily_question_quota'] or 'unlimited'} questions, "
+            f"{current_user['daily_token_quota'] or 'unlimited'} tokens)"
+        )
+
+        if breaker.state != "closed":
+            st.sidebar.warning("The question generator is failing; requests are served from stored questions where possible.")
+
+        # Admin-only user management and profiling of upcoming reruns
+        if st.session_state.get("is_admin"):
+            with st.sidebar.expander("Admin: users"):
+                st.table([
+                    {
+                        "User": user["username"], "Department": user["department"], "Weight": user["weight"],
+                        "Questions/day": user["daily_question_quota"] or "unlimited",
+                        "Tokens/day": user["daily_token_quota"] or "unlimited"
+                    }
+                    for user in fetch_users()
+                ])
+                with st.form("create_user_form", clear_on_submit=True):
+                    new_username = st.text_input("Username")
+                    new_password = st.text_input("Password", type="password")
+                    new_department = st.text_input("Department")
+                    new_weight = st.number_input("Fair-share weight:", min_value=0.1, max_value=10.0, value=1.0)
+                    new_question_quota = st.number_input("Questions per day (0 = unlimited):", min_value=0, value=500)
+                    new_token_quota = st.number_input("Tokens per day (0 = unlimited):", min_value=0, value=200000)
+                    if st.form_submit_button("Create user"):
+                        if not (new_username and new_password):
+                            st.error("Username and password are required.")
+                        elif fetch_user(new_username):
+                            st.error(f"User '{new_username}' already exists.")
+                        else:
+                            create_user(new_username, new_password, new_department or None, new_weight,
+                                        new_question_quota, new_token_quota)
+                            st.success(f"User '{new_username}' created.")
+            with st.sidebar.expander("Admin: profiling"):
+                profile_reruns = st.number_input("Reruns to profile:", min_value=1, max_value=50, value=3)
+                if st.button("Profile next reruns"):
+                    rerun_profiler.arm(profile_reruns)
+                    st.success(f"Profiling the next {profile_reruns} reruns.")
+                for profile_path in rerun_profiler.saved_profiles():
+                    with open(profile_path, "rb") as profile_file:
+                        st.download_button(
+                            label=os.path.basename(profile_path),
+                            data=profile_file.read(),
+                            file_name=os.path.basename(profile_path),
+                            key=f"profile_{profile_path}"
+                        )
+
+        # Main application
+        st.title("Question's Generator")
+
+        # Fetch existing data
+        subjects = fetch_subjects()
+        levels = fetch_levels()
+
+        # Subject Input with Dynamic Dropdown and Save
+        selected_subject = st.selectbox("Subject (select or add new):", subjects + ["Add new..."])
+        if selected_subject == "Add new...":
+            new_subject = st.text_input("Enter new subject:", key="new_subject")
+            if new_subject:
+                if st.button("Save Subject", key="save_subject"):
+                    insert_subject(new_subject)
+                    st.success(f"Subject '{new_subject}' added successfully!")
+                    st.rerun()
+
+        # Difficulty Level Input with Dynamic Dropdown and Save
+        selected_level = st.selectbox("Difficulty Level (select or add new):", levels + ["Add new..."])
+        if selected_level == "Add new...":
+            new_level = st.text_input("Enter new difficulty level:", key="new_level")
+            if new_level:
+                if st.button("Save Difficulty Level", key="save_level"):
+                    insert_level(new_level)
+                    st.success(f"Difficulty level '{new_level}' added successfully!")
+                    st.rerun()
+
+        # A background job for a subject or level the user has moved away from is dropped
+        if st.session_state.pending_job_id is not None and \
+                st.session_state.pending_job_inputs != (selected_subject, selected_level):
+            cancel_generation()
+            st.info("Cancelled the background job for the previous subject and level.")
+
+        # Question bank coverage for the current subject and level
+        if selected_subject != "Add new..." and selected_level != "Add new...":
+            bank_stats = fetch_bank_stats(selected_subject, selected_level)
+            if bank_stats:
+                st.caption("In stock: " + ", ".join(f"{row['question_type']}: {row['fresh']} fresh / {row['total']} total" for row in bank_stats))
+            else:
+                st.caption("No stored questions for this subject and level yet.")
+            with st.expander("Question bank coverage"):
+                st.table([
+                    {
+                        "Subject": row["subject"], "Level": row["level"], "Question Type": row["question_type"],
+                        "Fresh": row["fresh"], "Total": row["total"],
+                        "Newest": time.strftime("%Y-%m-%d %H:%M", time.localtime(row["newest_at"])) if row["newest_at"] else ""
+                    }
+                    for row in fetch_bank_stats(selected_subject)
+                ])
+
+        # Generation form: inputs only take effect together when the form is submitted
+        with st.form("generate_form"):
+            # Question Type Input
+            question_type = st.selectbox("Select Question Type:", ["MCQs", "True/False", "Multiple Correct Answers"])
+
+            # Static Input for Number of Questions
+            number_of_questions = st.number_input("Number of Questions:", min_value=1, max_value=100, value=10)
+
+            # Job mode hands generation to the worker processes started with `python jobs.py`
+            job_mode = st.checkbox("Run as background job", help="Keeps running across reruns and tab switches")
+
+            # Generate Questions Button
+            generate_clicked = st.form_submit_button("Generate Questions")
+
+        if generate_clicked:
+            if selected_subject and selected_level:
+                prewarm_worker.record_request(selected_subject, selected_level, question_type)
+                cancel_token = start_generation()
+                if job_mode:
+                    st.session_state.pending_job_id = enqueue_job(selected_subject, selected_level, question_type,
+                                                                  number_of_questions, owner=current_user["username"])
+                    st.session_state.pending_job_inputs = (selected_subject, selected_level)
+                else:
+                    questions = []
+                    cancel_placeholder = st.empty()
+                    cancel_placeholder.button("Cancel generation", key="cancel_generation", on_click=cancel_generation)
+                    queue_placeholder = st.empty()
+                    try:
+                        questions = serve_questions(selected_subject, number_of_questions, selected_level, question_type,
+                                                    user=current_user, on_wait=queue_notice(queue_placeholder),
+                                                    cancel=cancel_token)
+                    except (TimeoutError, QuotaExceeded, CircuitOpen, GenerationCancelled) as exc:
+                        st.error(str(exc))
+                    queue_placeholder.empty()
+                    cancel_placeholder.empty()
+                    prewarm_worker.note_activity()
+                    if questions:
+                        show_generated_questions(questions)
+                        if len(questions) < number_of_questions:
+                            st.warning(f"Only {len(questions)} of {number_of_questions} questions could be generated.")
+                    else:
+                        st.error("No questions generated. Please try again.")
+            else:
+                st.error("Please fill in both Subject and Difficulty Level.")
+
+        # Mixed quiz: several question types for the subject and level in one batched request
+        with st.expander("Mixed quiz"):
+            with st.form("mixed_quiz_form"):
+                type_counts = {
+                    mixed_type: st.number_input(f"{mixed_type}:", min_value=0, max_value=100, value=0, key=f"mixed_{mixed_type}")
+                    for mixed_type in ["MCQs", "True/False", "Multiple Correct Answers"]
+                }
+                mixed_clicked = st.form_submit_button("Generate Mixed Quiz")
+                # Same counts, drawn from stored questions without any LLM call
+                assemble_clicked = st.form_submit_button("Assemble from Bank")
+            groups = [(selected_subject, selected_level, mixed_type, count) for mixed_type, count in type_counts.items() if count]
+            if mixed_clicked:
+                if not (selected_subject and selected_level) or not groups:
+                    st.error("Please choose a subject, a difficulty level and at least one question count.")
+                else:
+                    for group in groups:
+                        prewarm_worker.record_request(group[0], group[1], group[2])
+                    cancel_token = start_generation()
+                    cancel_placeholder = st.empty()
+                    cancel_placeholder.button("Cancel generation", key="cancel_mixed_generation", on_click=cancel_generation)
+                    queue_placeholder = st.empty()
+                    try:
+                        results = serve_batch_questions(groups, user=current_user, on_wait=queue_notice(queue_placeholder),
+                                                        cancel=cancel_token)
+                    except (QuotaExceeded, CircuitOpen, GenerationCancelled) as exc:
+                        results = []
+                        st.error(str(exc))
+                    queue_placeholder.empty()
+                    cancel_placeholder.empty()
+                    questions = [q for group_questions in results for q in group_questions]
+                    prewarm_worker.note_activity()
+                    if questions:
+                        show_generated_questions(questions)
+                    elif results:
+                        st.error("No questions generated. Please try again.")
+            if assemble_clicked:
+                quiz_id, sampled = sample_quiz(groups, exclude_last=3, owner=current_user["username"])
+                if sampled:
+                    show_generated_questions([question for _, question in sampled])
+                    st.success(f"Quiz #{quiz_id} assembled with {len(sampled)} questions, none from the last 3 quizzes.")
+                else:
+                    st.error("Not enough stored questions for this selection.")
+
+        # Poll the pending generation job
+        if st.session_state.job_error:
+            st.error(st.session_state.job_error)
+            st.session_state.job_error = None
+        if st.session_state.pending_job_id is not None:
+            job_status()
+
+        # Generated list, selection and export
+        selection_area(selected_subject, selected_level)
+
+
+# Profile this rerun when an admin has armed the profiler
+with rerun_profiler.profile_rerun():
+    main()
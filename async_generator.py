@@ -0,0 +1,139 @@
+import argparse
+import asyncio
+import contextvars
+import logging
+import os
+import time
+import google.generativeai as genai
+from cassette import get_player, get_recorder
+from hedging import breaker
+from generator import (
+    MODEL_NAME, SHORTFALL_RETRIES, build_prompt, merge_questions, parse_chunk, plan_chunks
+)
+from question_bank import init_bank, store_questions
+from scheduler import scheduler, BATCH
+
+# Maximum in-flight model calls per event loop and per-request deadline.
+# Calls also take batch-priority scheduler slots, so across the deployment
+# at most GEMINI_CONCURRENCY - INTERACTIVE_RESERVED_SLOTS run at once (3 by
+# default); raise GEMINI_CONCURRENCY, quota permitting, for large prefills.
+ASYNC_CONCURRENCY = int(os.getenv("ASYNC_CONCURRENCY", "32"))
+ASYNC_TIMEOUT = float(os.getenv("ASYNC_TIMEOUT", "300"))
+
+logger = logging.getLogger(__name__)
+# Model seconds of the current task's last call, the async counterpart of
+# generator.last_model_seconds; queueing for a slot is not included
+_model_seconds = contextvars.ContextVar("model_seconds", default=None)
+
+
+# Async counterpart of generator.call_model, with the same cassette hooks and
+# circuit breaker (no hedging: the semaphore already bounds in-flight calls).
+# Each call takes a scheduler slot at batch priority, so bulk pre-generation
+# yields to interactive requests in every process.
+async def call_model_async(prompt, generation_config=None):
+    breaker.allow()
+    ticket = await scheduler.acquire_async(None, cost=0.0, priority=BATCH)
+    try:
+        text = await _call_model_async(prompt, generation_config)
+    except Exception:
+        breaker.record_failure()
+        raise
+    finally:
+        await scheduler.release_async(ticket)
+    breaker.record_success()
+    return text
+
+async def _call_model_async(prompt, generation_config):
+    started = time.monotonic()
+    player = get_player()
+    if player is not None:
+        entry = player.next_entry(prompt)
+        await asyncio.sleep(player.delay(entry))
+        _model_seconds.set(time.monotonic() - started)
+        return entry["text"]
+    response = await genai.GenerativeModel(MODEL_NAME).generate_content_async(prompt, generation_config=generation_config)
+    text = response.text.strip()
+    _model_seconds.set(time.monotonic() - started)
+    recorder = get_recorder()
+    if recorder is not None:
+        recorder.record(MODEL_NAME, prompt, generation_config, text, time.monotonic() - started)
+    return text
+
+# Function to generate questions without blocking the event loop
+async def generate_questions_async(subject, number, level, question_type, max_output_tokens=None, avoid=None):
+    prompt = build_prompt(subject, number, level, question_type, avoid)
+    generation_config = {"max_output_tokens": max_output_tokens} if max_output_tokens else None
+    return await call_model_async(prompt, generation_config)
+
+async def _generate_chunk(semaphore, subject, chunk, level, question_type, max_output_tokens, avoid):
+    async with semaphore:
+        questions_text = await generate_questions_async(subject, chunk, level, question_type, max_output_tokens, avoid)
+    return parse_chunk(questions_text, question_type, chunk, _model_seconds.get())
+
+# Same as generate_planned_questions, but the planned chunks of one request
+# are sent concurrently, bounded by the shared semaphore
+async def generate_planned_questions_async(semaphore, subject, number, level, question_type):
+    questions = []
+    avoid = None
+    for _ in range(SHORTFALL_RETRIES + 1):
+        missing = number - len(questions)
+        if missing <= 0:
+            break
+        results = await asyncio.gather(*(
+            _generate_chunk(semaphore, subject, chunk, level, question_type, max_output_tokens, avoid)
+            for chunk, max_output_tokens in plan_chunks(question_type, missing)
+        ))
+        for parsed in results:
+            merge_questions(questions, parsed)
+        avoid = [q.text for q in questions]
+    return questions[:number]
+
+# Run many (subject, number, level, question_type) requests from one event
+# loop. Each request gets its own timeout; failed or timed-out requests come
+# back as the exception instead of a question list. Cancelling the returned
+# coroutine cancels every in-flight call.
+async def generate_batch_async(requests, concurrency=ASYNC_CONCURRENCY, timeout=ASYNC_TIMEOUT):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(request):
+        return await asyncio.wait_for(generate_planned_questions_async(semaphore, *request), timeout)
+
+    return await asyncio.gather(*(run(request) for request in requests), return_exceptions=True)
+
+def generate_batch(requests, concurrency=ASYNC_CONCURRENCY, timeout=ASYNC_TIMEOUT):
+    return asyncio.run(generate_batch_async(requests, concurrency, timeout))
+
+# Batch pre-generation: fill the bank for every requested combination
+def prefill_bank(requests, concurrency=ASYNC_CONCURRENCY, timeout=ASYNC_TIMEOUT):
+    init_bank()
+    if concurrency > scheduler.batch_capacity():
+        logger.info("At most %d calls run at once: the batch capacity of the scheduler (see GEMINI_CONCURRENCY)",
+                    scheduler.batch_capacity())
+    stored = 0
+    for (subject, _, level, question_type), result in zip(requests, generate_batch(requests, concurrency, timeout)):
+        if isinstance(result, BaseException):
+            logger.error("%s / %s / %s failed: %r", subject, level, question_type, result)
+            continue
+        stored += store_questions(subject, level, question_type, result)
+    return stored
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-generate questions into the bank")
+    parser.add_argument("--subject", action="append", required=True)
+    parser.add_argument("--level", action="append", required=True)
+    parser.add_argument("--type", action="append", dest="question_types",
+                        choices=["MCQs", "True/False", "Multiple Correct Answers"], required=True)
+    parser.add_argument("--count", type=int, default=20, help="questions per combination")
+    parser.add_argument("--concurrency", type=int, default=ASYNC_CONCURRENCY,
+                        help="in-flight calls from this process, within the scheduler's batch capacity")
+    parser.add_argument("--timeout", type=float, default=ASYNC_TIMEOUT)
+    args = parser.parse_args()
+
+    requests = [
+        (subject, args.count, level, question_type)
+        for subject in args.subject
+        for level in args.level
+        for question_type in args.question_types
+    ]
+    print(f"Stored {prefill_bank(requests, args.concurrency, args.timeout)} questions")
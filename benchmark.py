@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import generator
+import question_bank
+from exporter import export_to_csv
+from questions import make_question
+from scheduler import SlotTable
+
+THRESHOLDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_thresholds.json")
+RESULTS_FILE = "benchmark_results.json"
+QUESTION_TYPES = ("MCQs", "True/False", "Multiple Correct Answers")
+WORDS = ("atom", "cell", "energy", "force", "matrix", "protein", "orbit", "enzyme", "vector", "isotope")
+
+
+# Synthetic fixtures, deterministic for a given seed
+def synthetic_text(rng, question_type, count):
+    lines = []
+    for number in range(1, count + 1):
+        stem = " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 14)))
+        lines.append(f"{number}. Which statement about {stem} is correct?")
+        if question_type == "True/False":
+            lines.append(f"Correct Answer: [{rng.choice(('True', 'False'))}]\n")
+            continue
+        for letter in "abcd":
+            lines.append(f"{letter}) {' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 6)))} {number}{letter}")
+        if question_type == "MCQs":
+            lines.append(f"\nCorrect Answer: [{rng.choice('abcd')}]\n")
+        else:
+            lines.append(f"\nCorrect Answers: [{', '.join(sorted(rng.sample('abcd', 2)))}]\n")
+    return "\n".join(lines)
+
+# Model output with the failure shapes seen in production: bold markup,
+# missing answers, truncated tails and chatter between questions
+def malformed_text(rng, count):
+    text = synthetic_text(rng, "MCQs", count)
+    blocks = text.split("\n\n")
+    for index in range(0, len(blocks), 5):
+        blocks[index] = "**" + blocks[index] + "**"
+    for index in range(2, len(blocks), 7):
+        blocks[index] = blocks[index].replace("Correct Answer", "Answer")
+    blocks.insert(len(blocks) // 2, "Sure! Here are some more questions for you:")
+    return "\n\n".join(blocks)[: int(len(text) * 0.9)]
+
+def synthetic_questions(rng, count):
+    questions = []
+    for _ in range(count):
+        question_type = rng.choice(QUESTION_TYPES)
+        text = " ".join(rng.choice(WORDS) for _ in range(10)) + "?"
+        if question_type == "True/False":
+            questions.append(make_question(question_type, text, answer=rng.choice(("True", "False"))))
+        else:
+            options = tuple(" ".join(rng.choice(WORDS) for _ in range(3)) for _ in range(4))
+            answer = rng.choice("abcd") if question_type == "MCQs" else ", ".join(sorted(rng.sample("abcd", 2)))
+            questions.append(make_question(question_type, text, options, answer))
+    return questions
+
+
+# Offline stand-in for genai.GenerativeModel that answers with synthetic text
+class OfflineModel:
+    latency = 0.0
+
+    def __init__(self, model_name):
+        self.rng = random.Random(model_name)
+
+    def generate_content(self, prompt, generation_config=None):
+        time.sleep(self.latency)
+        number = int(prompt.split()[1])
+        question_type = ("True/False" if "true/false" in prompt
+                         else "Multiple Correct Answers" if "multiple correct" in prompt else "MCQs")
+        response = type("Response", (), {})()
+        response.text = synthetic_text(self.rng, question_type, number)
+        return response
+
+
+def measure(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return {"median": statistics.median(timings), "min": min(timings), "max": max(timings), "repeat": repeat}
+
+def bench_parse(results, rng, repeat):
+    for question_type in QUESTION_TYPES:
+        text = synthetic_text(rng, question_type, 100)
+        results[f"parse/{question_type}/100"] = measure(lambda: generator.parse_questions(text, question_type), repeat)
+    text = malformed_text(rng, 100)
+    results["parse/malformed/100"] = measure(lambda: generator.parse_questions(text, "MCQs"), repeat)
+
+def bench_export(results, rng, repeat):
+    for rows in (100, 10000, 100000):
+        questions = synthetic_questions(rng, rows)
+        runs = repeat if rows < 100000 else max(1, repeat // 5)
+        results[f"export/csv/{rows}"] = measure(lambda: export_to_csv(questions, "Subject", "Level"), runs)
+
+def bench_database(results, rng, repeat, threads=8):
+    questions = synthetic_questions(rng, 2000)
+    by_type = {question_type: [q for q in questions if q.qtype.value == question_type] for question_type in QUESTION_TYPES}
+
+    def writers():
+        def work(index):
+            question_type = QUESTION_TYPES[index % len(QUESTION_TYPES)]
+            for start in range(0, len(by_type[question_type]), 50):
+                question_bank.store_questions(f"S{index}", "Gold", question_type, by_type[question_type][start:start + 50])
+        run_threads(work, threads)
+
+    def readers():
+        def work(index):
+            question_type = QUESTION_TYPES[index % len(QUESTION_TYPES)]
+            for _ in range(20):
+                question_bank.count_fresh_questions(f"S{index}", "Gold", question_type)
+                question_bank.take_questions(f"S{index}", "Gold", question_type, 10)
+        run_threads(work, threads)
+
+    results[f"db/store/{threads}-threads"] = measure(writers, repeat)
+    results[f"db/take/{threads}-threads"] = measure(readers, repeat)
+    results["db/sample_quiz"] = measure(
+        lambda: question_bank.sample_quiz([("S0", "Gold", "MCQs", 10), ("S1", "Gold", "True/False", 5)]), repeat
+    )
+
+def run_threads(work, threads):
+    workers = [threading.Thread(target=work, args=(index,)) for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+def bench_end_to_end(results, repeat):
+    original_model = generator.genai.GenerativeModel
+    generator.genai.GenerativeModel = OfflineModel
+    try:
+        for question_type in QUESTION_TYPES:
+            results[f"e2e/{question_type}/20"] = measure(
+                lambda: export_to_csv(generator.generate_planned_questions("Subject", 20, "Gold", question_type), "Subject", "Gold"),
+                repeat
+            )
+    finally:
+        generator.genai.GenerativeModel = original_model
+
+# Compare medians against the thresholds file; returns the list of regressions
+def check_thresholds(results, thresholds):
+    failures = []
+    for name, limit in thresholds.items():
+        if name in results and results[name]["median"] > limit:
+            failures.append(f"{name}: median {results[name]['median']:.4f}s exceeds {limit:.4f}s")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parse, export and database hot paths")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", default=RESULTS_FILE, help="where to write the JSON results")
+    parser.add_argument("--check", action="store_true", help="exit non-zero on regressions against the thresholds")
+    parser.add_argument("--thresholds", default=THRESHOLDS_FILE, help="JSON file of maximum median seconds per benchmark")
+    parser.add_argument("--only", choices=["parse", "export", "db", "e2e"], action="append")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    selected = set(args.only or ["parse", "export", "db", "e2e"])
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        # Never touch the live bank, or the scheduler state and generation
+        # cache shared with a running deployment
+        question_bank.DB_PATH = os.path.join(workdir, "bench.sqlite")
+        generator.scheduler.table = SlotTable(os.path.join(workdir, "scheduler_state.sqlite"))
+        generator.get_shared_cache = lambda: None
+        question_bank.init_bank()
+        if "parse" in selected:
+            bench_parse(results, rng, args.repeat)
+        if "export" in selected:
+            bench_export(results, rng, args.repeat)
+        if "db" in selected:
+            bench_database(results, rng, args.repeat)
+        if "e2e" in selected:
+            bench_end_to_end(results, args.repeat)
+
+    for name, timing in results.items():
+        print(f"{name:45} median {timing['median'] * 1000:10.3f} ms   min {timing['min'] * 1000:10.3f} ms")
+    with open(args.output, "w") as output:
+        json.dump({
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "results": results
+        }, output, indent=2)
+
+    if args.check:
+        with open(args.thresholds) as thresholds_file:
+            failures = check_thresholds(results, json.load(thresholds_file))
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        sys.exit(1 if failures else 0)
@@ -0,0 +1,23 @@
+import threading
+
+
+class GenerationCancelled(Exception):
+    pass
+
+
+# Set when the request it belongs to is superseded or abandoned. Model calls
+# check it while they wait and between streamed chunks.
+class CancelToken:
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.event.is_set():
+            raise GenerationCancelled("Generation was cancelled.")
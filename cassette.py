@@ -0,0 +1,94 @@
+import gzip
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+# GEMINI_CASSETTE_MODE: "record" appends every model call to the cassette,
+# "replay" serves responses from it instead of calling the API
+CASSETTE_MODE = os.getenv("GEMINI_CASSETTE_MODE", "").lower()
+CASSETTE_PATH = os.getenv("GEMINI_CASSETTE", "gemini_cassette.jsonl.gz")
+# 1.0 replays the recorded latency, 0 replays instantly
+REPLAY_LATENCY_SCALE = float(os.getenv("GEMINI_REPLAY_LATENCY_SCALE", "1.0"))
+# When set, prompts missing from the cassette are an error instead of being
+# answered with the next recorded response
+REPLAY_STRICT = os.getenv("GEMINI_REPLAY_STRICT", "0") == "1"
+
+
+# Appends one gzip-compressed JSON line per model call. Each write is its own
+# gzip member, so the file stays readable even if the process dies mid-run.
+class CassetteRecorder:
+    def __init__(self, path=CASSETTE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def record(self, model, prompt, generation_config, text, latency):
+        entry = {
+            "model": model,
+            "prompt": prompt,
+            "generation_config": generation_config,
+            "text": text,
+            "latency": latency,
+            "recorded_at": time.time()
+        }
+        with self.lock:
+            with gzip.open(self.path, "at", encoding="utf-8") as cassette:
+                cassette.write(json.dumps(entry) + "\n")
+
+
+# Serves recorded responses deterministically: repeated prompts get their
+# recordings in order, cycling when exhausted; unknown prompts get the
+# recordings in file order unless strict
+class CassettePlayer:
+    def __init__(self, path=CASSETTE_PATH, latency_scale=REPLAY_LATENCY_SCALE, strict=REPLAY_STRICT):
+        self.latency_scale = latency_scale
+        self.strict = strict
+        self.lock = threading.Lock()
+        self.by_prompt = OrderedDict()
+        self.in_order = deque()
+        with gzip.open(path, "rt", encoding="utf-8") as cassette:
+            for line in cassette:
+                entry = json.loads(line)
+                self.by_prompt.setdefault(entry["prompt"], deque()).append(entry)
+                self.in_order.append(entry)
+        if not self.in_order:
+            raise ValueError(f"Cassette {path} has no recordings")
+
+    def next_entry(self, prompt):
+        with self.lock:
+            recordings = self.by_prompt.get(prompt)
+            if recordings is None:
+                if self.strict:
+                    raise KeyError(f"Prompt not in cassette: {prompt[:80]!r}")
+                recordings = self.in_order
+            entry = recordings[0]
+            recordings.rotate(-1)
+        return entry
+
+    def delay(self, entry):
+        return entry["latency"] * self.latency_scale
+
+    def replay(self, prompt):
+        entry = self.next_entry(prompt)
+        time.sleep(self.delay(entry))
+        return entry["text"]
+
+
+_recorder = None
+_player = None
+_cassette_lock = threading.Lock()
+
+def get_recorder():
+    global _recorder
+    with _cassette_lock:
+        if _recorder is None and CASSETTE_MODE == "record":
+            _recorder = CassetteRecorder()
+        return _recorder
+
+def get_player():
+    global _player
+    with _cassette_lock:
+        if _player is None and CASSETTE_MODE == "replay":
+            _player = CassettePlayer()
+        return _player
@@ -0,0 +1,93 @@
+import math
+import os
+import threading
+
+# Chunk sizes the planner chooses from and the model's hard output limit
+CHUNK_SIZES = (5, 10, 15, 20, 25, 30, 40, 50)
+MODEL_OUTPUT_LIMIT = int(os.getenv("MODEL_OUTPUT_LIMIT", "8192"))
+# Rough characters per token, used when the response carries no usage metadata
+CHARS_PER_TOKEN = 4
+# Starting guesses until real calls have been observed
+DEFAULT_TOKENS_PER_QUESTION = {"MCQs": 70, "True/False": 25, "Multiple Correct Answers": 80}
+DEFAULT_CALL_OVERHEAD = 1.5
+DEFAULT_SECONDS_PER_TOKEN = 0.005
+# Weight given to the newest observation in the moving averages
+SMOOTHING = 0.3
+# Headroom on max_output_tokens so a slightly long answer isn't cut mid-question
+TOKEN_HEADROOM = 1.3
+
+
+def _ema(previous, value):
+    if previous is None:
+        return value
+    return previous + SMOOTHING * (value - previous)
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+# Learns output tokens per question, call latency and parse yield per
+# (question type, model) and picks the chunk size with the best yield per second
+class ChunkPlanner:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tokens_per_question = {}
+        self.call_overhead = {}
+        self.seconds_per_token = {}
+        # Fraction of requested questions that parsed, per chunk size
+        self.parse_yield = {}
+
+    def _expected(self, key, question_type, chunk):
+        tokens_per_question = self.tokens_per_question.get(key) or DEFAULT_TOKENS_PER_QUESTION.get(question_type, 70)
+        overhead = self.call_overhead.get(key) or DEFAULT_CALL_OVERHEAD
+        seconds_per_token = self.seconds_per_token.get(key) or DEFAULT_SECONDS_PER_TOKEN
+        # Untried chunk sizes start optimistic, capped by what fits in the output limit
+        fit = min(1.0, MODEL_OUTPUT_LIMIT / (chunk * tokens_per_question))
+        parse_yield = self.parse_yield.get((key, chunk), fit)
+        seconds = overhead + chunk * tokens_per_question * seconds_per_token
+        return parse_yield, seconds, tokens_per_question
+
+    # Returns (chunk_size, max_output_tokens) for the next call
+    def plan(self, question_type, model, remaining):
+        key = (question_type, model)
+        with self.lock:
+            best = None
+            for chunk in CHUNK_SIZES:
+                chunk = min(chunk, remaining)
+                parse_yield, seconds, tokens_per_question = self._expected(key, question_type, chunk)
+                # Expected parsed questions per second of waiting
+                score = chunk * parse_yield / seconds
+                if best is None or score > best[0]:
+                    best = (score, chunk, tokens_per_question)
+                if chunk == remaining:
+                    break
+        _, chunk, tokens_per_question = best
+        max_output_tokens = min(MODEL_OUTPUT_LIMIT, math.ceil(chunk * tokens_per_question * TOKEN_HEADROOM))
+        return chunk, max_output_tokens
+
+    def record(self, question_type, model, requested, parsed, output_tokens, seconds):
+        key = (question_type, model)
+        with self.lock:
+            if parsed:
+                self.tokens_per_question[key] = _ema(self.tokens_per_question.get(key), output_tokens / parsed)
+            if output_tokens and seconds > 0:
+                # Split latency into a fixed per-call part and a per-token part
+                overhead = self.call_overhead.get(key) or DEFAULT_CALL_OVERHEAD
+                overhead = min(overhead, seconds)
+                self.seconds_per_token[key] = _ema(self.seconds_per_token.get(key), max(seconds - overhead, 0.0) / output_tokens)
+                self.call_overhead[key] = max(0.1, _ema(self.call_overhead.get(key), seconds - output_tokens * self.seconds_per_token[key]))
+            bucket = (key, requested)
+            self.parse_yield[bucket] = _ema(self.parse_yield.get(bucket), min(1.0, parsed / requested))
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "tokens_per_question": dict(self.tokens_per_question),
+                "call_overhead": dict(self.call_overhead),
+                "seconds_per_token": dict(self.seconds_per_token),
+                "parse_yield": dict(self.parse_yield),
+            }
+
+
+planner = ChunkPlanner()
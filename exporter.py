@@ -0,0 +1,113 @@
+import csv
+import gzip
+import io
+import json
+import re
+import zipfile
+from io import StringIO
+from questions import OPTION_LETTERS, QuestionType, make_question
+from variants import make_variants
+
+CSV_HEADER = [
+    "Question Text", "Question Type", "Option 1", "Option 2",
+    "Option 3", "Option 4", "isCorrectOption1", "isCorrectOption2",
+    "isCorrectOption3", "isCorrectOption4", "Subject", "Level"
+]
+VARIANT_COLUMN = "Variant"
+
+# Build the CSV row for one question
+def question_to_csv_row(question, subject, level):
+    if question.qtype is QuestionType.TRUE_FALSE:
+        # Handle True/False
+        is_correct = question.answer == "True"
+        return [
+            question.text,
+            question.qtype.value,
+            "",  # No options for True/False
+            "",  # No options for True/False
+            "",  # No options for True/False
+            "",  # No options for True/False
+            is_correct,  # Only one correct answer
+            "",  # No options for True/False
+            "",  # No options for True/False
+            "",  # No options for True/False
+            subject,
+            level
+        ]
+    # Handle MCQs and Multiple Correct Answers
+    correct_letters = question.correct_letters
+    return [
+        question.text,
+        question.qtype.value,
+        question.a or "",
+        question.b or "",
+        question.c or "",
+        question.d or "",
+        "a" in correct_letters,
+        "b" in correct_letters,
+        "c" in correct_letters,
+        "d" in correct_letters,
+        subject,
+        level
+    ]
+
+# Write the CSV; with variants > 1 each exam variant is written in turn with
+# its number in an extra trailing "Variant" column
+def write_csv(stream, selected_questions, subject, level, variants=1, seed=0):
+    csv_writer = csv.writer(stream)
+    if variants <= 1:
+        csv_writer.writerow(CSV_HEADER)
+        for question in selected_questions:
+            csv_writer.writerow(question_to_csv_row(question, subject, level))
+        return
+    csv_writer.writerow(CSV_HEADER + [VARIANT_COLUMN])
+    for variant, questions in enumerate(make_variants(selected_questions, variants, seed), start=1):
+        for question in questions:
+            csv_writer.writerow(question_to_csv_row(question, subject, level) + [variant])
+
+# Export to CSV function with refined output
+def export_to_csv(selected_questions, subject, level, variants=1, seed=0):
+    csv_buffer = StringIO()
+    write_csv(csv_buffer, selected_questions, subject, level, variants, seed)
+    csv_buffer.seek(0)
+    return csv_buffer.getvalue()
+
+# Single gzip-compressed CSV, compressed row by row as it is written
+def export_to_gzip(selected_questions, subject, level, variants=1, seed=0):
+    archive = io.BytesIO()
+    with gzip.GzipFile(filename="questions.csv", mode="wb", fileobj=archive, mtime=0) as gz:
+        with io.TextIOWrapper(gz, encoding="utf-8", newline="") as stream:
+            write_csv(stream, selected_questions, subject, level, variants, seed)
+    return archive.getvalue()
+
+def _file_name(label):
+    return re.sub(r"[^A-Za-z0-9]+", "_", label).strip("_").lower() + ".csv"
+
+# Zip archive with one CSV per question type and a manifest.json. Each member
+# is streamed into the archive, so the full CSV text is never held in memory.
+def export_to_zip(selected_questions, subject, level, variants=1, seed=0):
+    groups = {}
+    for question in selected_questions:
+        groups.setdefault(question.qtype, []).append(question)
+
+    manifest = {"subject": subject, "level": level, "total_questions": len(selected_questions), "variants": variants, "files": []}
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for qtype, questions in groups.items():
+            file_name = _file_name(qtype.value)
+            with zf.open(file_name, "w") as member:
+                with io.TextIOWrapper(member, encoding="utf-8", newline="") as stream:
+                    write_csv(stream, questions, subject, level, variants, seed)
+            manifest["files"].append({"file": file_name, "question_type": qtype.value, "questions": len(questions)})
+        zf.writestr("manifest.json", json.dumps(manifest, indent=2))
+    return archive.getvalue()
+
+# Inverse of question_to_csv_row; returns (question, subject, level)
+def csv_row_to_question(row):
+    row = row[:len(CSV_HEADER)]  # ignore the Variant column of multi-variant exports
+    text, question_type, option_1, option_2, option_3, option_4, *is_correct, subject, level = row
+    if question_type == QuestionType.TRUE_FALSE.value:
+        return make_question(question_type, text, answer=str(is_correct[0] == "True")), subject, level
+    letters = [letter for letter, flag in zip(OPTION_LETTERS, is_correct) if flag == "True"]
+    options = (option_1, option_2, option_3, option_4)
+    return make_question(question_type, text, options, ", ".join(letters)), subject, level
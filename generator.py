@@ -0,0 +1,536 @@
+import google.generativeai as genai
+import contextlib
+from dotenv import load_dotenv
+import os
+import re
+import threading
+import time
+from cassette import get_player, get_recorder
+from chunk_planner import MODEL_OUTPUT_LIMIT, planner, estimate_tokens
+from questions import make_question
+from question_bank import take_questions, restock_questions, sample_questions
+from scheduler import scheduler, INTERACTIVE, BATCH, BACKGROUND
+from hedging import HEDGE_ENABLED, CircuitOpen, breaker, hedge_budget, latency_tracker, release_once, run_hedged, POLL_SECONDS
+from cancellation import GenerationCancelled
+from shared_cache import CacheError, cache_key, get_shared_cache
+from users import check_quota, record_usage
+from quality import validate_questions
+
+# Load environment variables
+load_dotenv()
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+genai.configure(api_key=GOOGLE_API_KEY)
+MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+
+SHORTFALL_RETRIES = int(os.getenv("SHORTFALL_RETRIES", "2"))
+
+# Function to build the generation prompt
+def build_prompt(subject, number, level, question_type, avoid=None):
+    difficulty_mapping = {
+        "Bronze": "basic",
+        "Silver": "intermediate",
+        "Gold": "advanced",
+        "Platinum": "expert",
+        "Diamond": "most difficult"
+    }
+    difficulty = difficulty_mapping.get(level, "basic")
+    
+    if question_type == "MCQs":
+        prompt = f"Generate {number} multiple choice questions for the subject '{subject}' at a {difficulty} level in this format:\n\n" \
+                 f"1. Question?\n" \
+                 f"a) Option 1\n" \
+                 f"b) Option 2\n" \
+                 f"c) Option 3\n" \
+                 f"d) Option 4\n\n" \
+                 f"Correct Answer: [Option]\n\n"
+    elif question_type == "True/False":
+        prompt = f"Generate {number} true/false questions for the subject '{subject}' at a {difficulty} level in this format:\n\n" \
+                 f"1. Question?\n" \
+                 f"Correct Answer: [True/False]\n\n"
+    elif question_type == "Multiple Correct Answers":
+        prompt = f"Generate {number} questions with multiple correct answers for the subject '{subject}' at a {difficulty} level in this format:\n\n" \
+                 f"1. Question?\n" \
+                 f"a) Option 1\n" \
+                 f"b) Option 2\n" \
+                 f"c) Option 3\n" \
+                 f"d) Option 4\n\n" \
+                 f"Correct Answers: [Option1, Option2]\n\n"
+
+    # Steer follow-up requests away from questions the user already has
+    if avoid:
+        prompt += "Do not repeat or rephrase any of these questions:\n" + \
+                  "".join(f"- {stem[:200]}\n" for stem in avoid)
+    return prompt
+
+# Who the calling thread's model calls are for. Set per request with
+# generation_context; calls made outside one run as unmetered batch work.
+class GenerationContext:
+    def __init__(self, user=None, priority=BATCH, on_wait=None, cancel=None):
+        self.user = user
+        self.priority = priority
+        self.on_wait = on_wait
+        self.cancel = cancel
+        # A request is charged to the user's rate bucket once, on its first call
+        self.charged = False
+        # Model calls made so far, hedges included, for callers with a call budget
+        self.calls = 0
+
+    # Called periodically while a call is queued (position >= 1) or running
+    # (position 0). Raising here abandons the call.
+    def poll(self, position):
+        if self.cancel is not None:
+            self.cancel.raise_if_cancelled()
+        if self.on_wait is not None:
+            self.on_wait(position)
+
+_DEFAULT_CONTEXT = GenerationContext()
+_context = threading.local()
+
+def current_context():
+    return getattr(_context, "current", None) or _DEFAULT_CONTEXT
+
+@contextlib.contextmanager
+def generation_context(user=None, priority=BATCH, on_wait=None, cancel=None):
+    previous = getattr(_context, "current", None)
+    _context.current = GenerationContext(user, priority, on_wait, cancel)
+    try:
+        yield _context.current
+    finally:
+        _context.current = previous
+
+# Take a scheduler slot for one model call, so higher priority requests get
+# the next slot between the calls of a long request
+def _acquire_model_slot(context):
+    user = context.user
+    cost = 0.0 if user is None or context.charged else 1.0
+    ticket = scheduler.acquire(user["username"] if user else None, user["weight"] if user else 1.0, cost,
+                               on_wait=context.poll, priority=context.priority)
+    context.charged = True
+    return ticket
+
+# A hedge only runs in a slot that is free right now, at background priority,
+# and within the hedge budget
+def _start_hedge():
+    if not hedge_budget.spend():
+        return None
+    ticket = scheduler.try_acquire(None, priority=BACKGROUND)
+    return None if ticket is None else lambda: scheduler.release(ticket)
+
+# Latencies are tracked per output size, rounded up to a power of two
+def _latency_key(generation_config):
+    max_output_tokens = (generation_config or {}).get("max_output_tokens") or 0
+    return 1 << max(0, int(max_output_tokens) - 1).bit_length()
+
+# One attempt at a model call: cassette replay or the live API. With a
+# cancel token the response is streamed and dropped as soon as it is cancelled.
+# Returns the text and the seconds the model took, without any queueing.
+def _call_once(prompt, generation_config, cancel=None):
+    started = time.monotonic()
+    player = get_player()
+    if player is not None:
+        text = player.replay(prompt)
+    elif cancel is not None:
+        response = genai.GenerativeModel(MODEL_NAME).generate_content(prompt, generation_config=generation_config, stream=True)
+        parts = []
+        for chunk in response:
+            cancel.raise_if_cancelled()
+            parts.append(chunk.text)
+        text = "".join(parts).strip()
+    else:
+        response = genai.GenerativeModel(MODEL_NAME).generate_content(prompt, generation_config=generation_config)
+        text = response.text.strip()
+    if player is None:
+        recorder = get_recorder()
+        if recorder is not None:
+            recorder.record(MODEL_NAME, prompt, generation_config, text, time.monotonic() - started)
+    seconds = time.monotonic() - started
+    latency_tracker.record(_latency_key(generation_config), seconds)
+    return text, seconds
+
+# Identical calls running at the same time on different app replicas are
+# made once when GENERATION_CACHE_URL is set (see shared_cache.py). Answers
+# are never reused afterwards: each Generate click gets a fresh set.
+# How long one replica may hold a prompt that the others wait on
+GENERATION_CACHE_LOCK_TTL = float(os.getenv("GENERATION_CACHE_LOCK_TTL", "120"))
+# How long a finished call's answer stays up for the replicas waiting on it
+GENERATION_CACHE_RESULT_TTL = float(os.getenv("GENERATION_CACHE_RESULT_TTL", "30"))
+
+# Model seconds of the calling thread's last call_model, for the chunk
+# planner; None when another replica's call answered it
+_last_call = threading.local()
+
+def last_model_seconds():
+    return getattr(_last_call, "seconds", None)
+
+# Take the lock on `key`, or wait for the call holding it to publish its
+# answer. Returns (flight id, None) with the lock held by us, or (None, answer).
+def _claim_or_wait(cache, key):
+    context = current_context()
+    while True:
+        flight = os.urandom(8).hex()
+        if cache.add(key + ":lock", flight.encode(), GENERATION_CACHE_LOCK_TTL):
+            return flight, None
+        running = cache.get(key + ":lock")
+        # The holder finished (or gave up) in between: try to take over
+        while running is not None:
+            time.sleep(POLL_SECONDS)
+            context.poll(0)
+            answer = cache.get(key + ":" + running.decode())
+            if answer is not None:
+                return None, answer
+            if cache.get(key + ":lock") != running:
+                break
+
+# Every model call goes through here. Only one replica at a time makes a
+# given call (set-if-absent on a lock key); the others wait for its answer.
+# Background calls don't take part, and a broken cache just means no sharing.
+def call_model(prompt, generation_config=None):
+    _last_call.seconds = None
+    cache = get_shared_cache()
+    if cache is None or current_context().priority == BACKGROUND:
+        return _call_model(prompt, generation_config)
+    # The output cap varies between otherwise identical calls, so it isn't part of the key
+    key = cache_key(MODEL_NAME, prompt)
+    try:
+        flight, answer = _claim_or_wait(cache, key)
+    except CacheError:
+        return _call_model(prompt, generation_config)
+    if answer is not None:
+        return answer.decode("utf-8")
+    try:
+        text = _call_model(prompt, generation_config)
+        try:
+            cache.set(key + ":" + flight, text.encode("utf-8"), GENERATION_CACHE_RESULT_TTL)
+        except CacheError:
+            pass
+    finally:
+        try:
+            cache.delete(key + ":lock")
+        except CacheError:
+            pass
+    return text
+
+# The model call itself, scheduled, guarded by the circuit breaker,
+# optionally hedged, cancelled, and recorded to or replayed from a cassette
+# (see cassette.py)
+def _call_model(prompt, generation_config):
+    context = current_context()
+    breaker.allow()
+    ticket = _acquire_model_slot(context)
+    context.calls += 1
+    release = release_once(lambda: scheduler.release(ticket))
+    hedged = False
+    try:
+        if HEDGE_ENABLED or context.cancel is not None:
+            if HEDGE_ENABLED:
+                hedge_budget.earn()
+            delay = latency_tracker.deadline(_latency_key(generation_config)) if HEDGE_ENABLED else None
+            # Runs in the pool so this thread can keep polling for cancellation;
+            # our slot is released when the first copy finishes
+            (text, seconds), hedged = run_hedged(lambda: _call_once(prompt, generation_config, context.cancel),
+                                      delay, _start_hedge, release, poll=lambda: context.poll(0))
+        else:
+            text, seconds = _call_once(prompt, generation_config)
+            release()
+    except Exception as exc:
+        if not isinstance(exc, GenerationCancelled):
+            breaker.record_failure()
+        release()
+        raise
+    except BaseException:
+        # The caller is going away (e.g. its Streamlit session reran): stop
+        # the call and free its slot now rather than when it winds down
+        if context.cancel is not None:
+            context.cancel.cancel()
+        release()
+        raise
+    breaker.record_success()
+    _last_call.seconds = seconds
+    count_tokens(prompt, text)
+    if hedged:
+        # The duplicate call is paid for as well
+        context.calls += 1
+        count_tokens(prompt, text)
+    return text
+
+# Estimated tokens spent by the calling thread, for per-user daily quotas
+_usage = threading.local()
+
+def count_tokens(prompt, text):
+    _usage.tokens = getattr(_usage, "tokens", 0) + estimate_tokens(prompt) + estimate_tokens(text)
+
+def tokens_used():
+    return getattr(_usage, "tokens", 0)
+
+# Function to generate questions
+def generate_questions(subject, number, level, question_type, max_output_tokens=None, avoid=None):
+    prompt = build_prompt(subject, number, level, question_type, avoid)
+    generation_config = {"max_output_tokens": max_output_tokens} if max_output_tokens else None
+    return call_model(prompt, generation_config)
+
+# Parsing function with refined output
+def parse_questions(questions_text, question_type):
+    if question_type == "MCQs":
+        question_pattern = r'(\d+\..+?)\s*(a\).+?)\s*(b\).+?)\s*(c\).+?)\s*(d\).+?)\s*Correct Answer: \[([a-d])\]'
+    elif question_type == "True/False":
+        question_pattern = r'(\d+\..+?)\s*Correct Answer: \[(True|False)\]'
+    elif question_type == "Multiple Correct Answers":
+        question_pattern = r'(\d+\..+?)\s*(a\).+?)\s*(b\).+?)\s*(c\).+?)\s*(d\).+?)\s*Correct Answers: \[([a-d, ]+)\]'
+    
+    questions = []
+    matches = re.findall(question_pattern, questions_text, re.DOTALL)
+
+    for match in matches:
+        if question_type == "MCQs":
+            question_text, option_a, option_b, option_c, option_d, correct_answer = match
+            clean_question = re.sub(r'^\d+\.\s*', '', question_text).strip()
+            clean_option_a = re.sub(r'^a\)\s*', '', option_a).strip()
+            clean_option_b = re.sub(r'^b\)\s*', '', option_b).strip()
+            clean_option_c = re.sub(r'^c\)\s*', '', option_c).strip()
+            clean_option_d = re.sub(r'^d\)\s*', '', option_d).strip()
+            questions.append(make_question(
+                question_type,
+                clean_question,
+                (clean_option_a, clean_option_b, clean_option_c, clean_option_d),
+                correct_answer
+            ))
+        elif question_type == "True/False":
+            question_text, correct_answer = match
+            clean_question = re.sub(r'^\d+\.\s*', '', question_text).strip()
+            questions.append(make_question(question_type, clean_question, answer=correct_answer))
+        elif question_type == "Multiple Correct Answers":
+            question_text, option_a, option_b, option_c, option_d, correct_answers = match
+            clean_question = re.sub(r'^\d+\.\s*', '', question_text).strip()
+            clean_option_a = re.sub(r'^a\)\s*', '', option_a).strip()
+            clean_option_b = re.sub(r'^b\)\s*', '', option_b).strip()
+            clean_option_c = re.sub(r'^c\)\s*', '', option_c).strip()
+            clean_option_d = re.sub(r'^d\)\s*', '', option_d).strip()
+            questions.append(make_question(
+                question_type,
+                clean_question,
+                (clean_option_a, clean_option_b, clean_option_c, clean_option_d),
+                correct_answers
+            ))
+
+    return questions
+
+
+# Append parsed questions to `questions` in place, skipping repeated stems
+def merge_questions(questions, parsed):
+    seen = {q.text.lower() for q in questions}
+    for question in parsed:
+        if question.text.lower() not in seen:
+            seen.add(question.text.lower())
+            questions.append(question)
+
+# Chunk sizes and max_output_tokens for a request, as chosen by the planner
+def plan_chunks(question_type, number):
+    chunks = []
+    remaining = number
+    while remaining > 0:
+        chunk, max_output_tokens = planner.plan(question_type, MODEL_NAME, remaining)
+        chunks.append((chunk, max_output_tokens))
+        remaining -= chunk
+    return chunks
+
+# Parse and validate one chunk's response and feed its outcome back into the
+# planner (unless elapsed is None); rejected questions count as missing so
+# shortfall recovery redoes them
+def parse_chunk(questions_text, question_type, chunk, elapsed):
+    parsed = parse_questions(questions_text, question_type) if questions_text else []
+    accepted, _ = validate_questions(parsed)
+    if elapsed is not None:
+        planner.record(question_type, MODEL_NAME, chunk, len(accepted), estimate_tokens(questions_text or ""), elapsed)
+    return accepted[:chunk]
+
+# Split a request into chunks sized by the planner so large counts don't come
+# back truncated. Parsed questions are merged into `questions` in place.
+def _fill_questions(questions, subject, number, level, question_type, avoid=None):
+    for chunk, max_output_tokens in plan_chunks(question_type, number):
+        questions_text = generate_questions(subject, chunk, level, question_type, max_output_tokens, avoid)
+        # The model's own latency, not time spent queueing for a slot
+        merge_questions(questions, parse_chunk(questions_text, question_type, chunk, last_model_seconds()))
+
+# Ask again for just the missing count instead of regenerating the whole set
+def _recover_shortfall(questions, subject, number, level, question_type):
+    retries = 0
+    while len(questions) < number and retries < SHORTFALL_RETRIES:
+        retries += 1
+        avoid = [q.text for q in questions]
+        _fill_questions(questions, subject, number - len(questions), level, question_type, avoid)
+    del questions[number:]
+
+def generate_planned_questions(subject, number, level, question_type):
+    questions = []
+    _fill_questions(questions, subject, number, level, question_type)
+    _recover_shortfall(questions, subject, number, level, question_type)
+    return questions
+
+# Batched prompts: several (subject, level, question_type, count) groups in one
+# call, each in its own delimited section, to save per-call overhead on small groups
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "40"))
+SECTION_MARKER = re.compile(r"^\s*=+\s*SECTION\s+(\d+)\s*=+\s*$", re.MULTILINE | re.IGNORECASE)
+
+def build_batch_prompt(groups):
+    prompt = "Answer each numbered section below separately. Begin each section with its marker line " \
+             "exactly as shown (for example '=== SECTION 1 ==='), number the questions from 1 within " \
+             "each section, and follow that section's format.\n\n"
+    for index, (subject, level, question_type, count) in enumerate(groups, start=1):
+        prompt += f"=== SECTION {index} ===\n" + build_prompt(subject, count, level, question_type)
+    return prompt
+
+# Split a batched response into {section number: section text}
+def split_batch_response(questions_text):
+    parts = SECTION_MARKER.split(questions_text)
+    return {int(number): text for number, text in zip(parts[1::2], parts[2::2])}
+
+# Pack (index, group) pairs into batches of at most BATCH_MAX_QUESTIONS questions
+def _pack_batches(indexed_groups):
+    batches, current, current_total = [], [], 0
+    for index, group in indexed_groups:
+        if current and current_total + group[3] > BATCH_MAX_QUESTIONS:
+            batches.append(current)
+            current, current_total = [], 0
+        current.append((index, group))
+        current_total += group[3]
+    if current:
+        batches.append(current)
+    return batches
+
+def _generate_batch_call(groups):
+    # Budget every planned chunk of each group, within what one call can return
+    max_output_tokens = min(MODEL_OUTPUT_LIMIT, sum(
+        tokens for _, _, question_type, count in groups for _, tokens in plan_chunks(question_type, count)
+    ))
+    prompt = build_batch_prompt(groups)
+    sections = split_batch_response(call_model(prompt, {"max_output_tokens": max_output_tokens}))
+    results = []
+    for index, (_, _, question_type, count) in enumerate(groups, start=1):
+        section_text = sections.get(index, "")
+        accepted, _ = validate_questions(parse_questions(section_text, question_type) if section_text else [])
+        results.append(accepted[:count])
+    return results
+
+# Generate several groups with as few calls as possible; returns one question
+# list per group, in order. Groups too big to share a call, and any shortfall
+# left after the batched call, go through the regular planned path.
+def generate_batch_questions(groups):
+    results = [[] for _ in groups]
+    batched = set()
+    small = [(index, group) for index, group in enumerate(groups) if 0 < group[3] < BATCH_MAX_QUESTIONS]
+    for batch in _pack_batches(small):
+        if len(batch) < 2:
+            continue
+        parsed_groups = _generate_batch_call([group for _, group in batch])
+        for (index, _), parsed in zip(batch, parsed_groups):
+            merge_questions(results[index], parsed)
+            batched.add(index)
+    for index, (subject, level, question_type, count) in enumerate(groups):
+        if index not in batched:
+            _fill_questions(results[index], subject, count, level, question_type)
+        _recover_shortfall(results[index], subject, count, level, question_type)
+    return results
+
+# Single-flight coalescing: identical requests that arrive while a call is
+# already running wait for that call and share its parsed result
+COALESCE_TIMEOUT = float(os.getenv("COALESCE_TIMEOUT", "120"))
+
+class _Flight:
+    def __init__(self, context):
+        self.context = context
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+# Wait in short slices so a waiter can still be cancelled
+def _wait_for_flight(flight, timeout):
+    context = current_context()
+    deadline = time.monotonic() + timeout
+    while not flight.done.wait(max(0.0, min(POLL_SECONDS, deadline - time.monotonic()))):
+        if time.monotonic() >= deadline:
+            return False
+        context.poll(0)
+    return True
+
+def generate_parsed_questions(subject, number, level, question_type, timeout=COALESCE_TIMEOUT):
+    key = (subject, number, level, question_type)
+    while True:
+        with _flights_lock:
+            flight = _flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _flights[key] = _Flight(current_context())
+            elif flight.context is not _DEFAULT_CONTEXT:
+                # Run the shared call at the most urgent waiter's priority
+                flight.context.priority = min(flight.context.priority, current_context().priority)
+
+        if leader:
+            try:
+                flight.result = generate_planned_questions(subject, number, level, question_type)
+            except BaseException as exc:
+                flight.error = exc
+            finally:
+                with _flights_lock:
+                    del _flights[key]
+                flight.done.set()
+        elif not _wait_for_flight(flight, timeout):
+            raise TimeoutError(f"Timed out after {timeout}s waiting for an identical generation request")
+
+        # A cancelled leader only cancels its own request; waiters start over
+        cancelled = isinstance(flight.error, GenerationCancelled) or \
+            (flight.error is not None and not isinstance(flight.error, Exception))
+        if cancelled and not leader:
+            continue
+        if flight.error is not None:
+            raise flight.error
+        # Each caller gets its own list so appending to it doesn't leak across sessions
+        return list(flight.result)
+
+
+# Serve a request from pre-generated stock first and only ask the LLM for the
+# rest. `user` is a dict from users.fetch_user; with None there is no quota
+# check or usage accounting. Model calls are scheduled at `priority`, and
+# `cancel` (a CancelToken) aborts them.
+def serve_questions(subject, number, level, question_type, user=None, on_wait=None, priority=INTERACTIVE, cancel=None):
+    if user is not None:
+        check_quota(user, number)
+    tokens_before = tokens_used()
+    stock_ids, questions = take_questions(subject, level, question_type, number)
+    if len(questions) < number:
+        try:
+            with generation_context(user, priority, on_wait, cancel):
+                # Fresh output can repeat a stocked stem, e.g. both came from the same prompt
+                merge_questions(questions, generate_parsed_questions(subject, number - len(questions), level, question_type))
+        except CircuitOpen:
+            # The model is failing: fall back to questions served before
+            merge_questions(questions, sample_questions(subject, level, question_type, number - len(questions)))
+            if not questions:
+                raise
+        except BaseException:
+            # Cancelled or failed: put the stock questions back and still
+            # charge the tokens already spent
+            restock_questions(stock_ids)
+            if user is not None:
+                record_usage(user["username"], 0, tokens_used() - tokens_before)
+            raise
+    if user is not None:
+        record_usage(user["username"], len(questions), tokens_used() - tokens_before)
+    return questions
+
+def serve_batch_questions(groups, user=None, on_wait=None, priority=INTERACTIVE, cancel=None):
+    if user is not None:
+        check_quota(user, sum(group[3] for group in groups))
+    tokens_before = tokens_used()
+    try:
+        with generation_context(user, priority, on_wait, cancel):
+            results = generate_batch_questions(groups)
+    except BaseException:
+        if user is not None:
+            record_usage(user["username"], 0, tokens_used() - tokens_before)
+        raise
+    if user is not None:
+        record_usage(user["username"], sum(len(result) for result in results), tokens_used() - tokens_before)
+    return results
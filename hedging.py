@@ -0,0 +1,187 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Hedged requests: when a call runs past the recent p95 latency, send a
+# duplicate and keep whichever answer arrives first. Off by default.
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "0") == "1"
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.95"))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "200"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "1.0"))
+# Extra calls hedging may add, as a fraction of all calls
+HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", "0.1"))
+HEDGE_WORKERS = int(os.getenv("HEDGE_WORKERS", "16"))
+
+# Circuit breaker: open when at least BREAKER_ERROR_RATE of the last
+# BREAKER_WINDOW calls failed, then allow one trial call after the cooldown
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+# Recent call latencies per key (e.g. output size bucket) and their quantile
+class LatencyTracker:
+    def __init__(self, window=HEDGE_WINDOW, quantile=HEDGE_QUANTILE, min_samples=HEDGE_MIN_SAMPLES,
+                 min_delay=HEDGE_MIN_DELAY):
+        self.window = window
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def record(self, key, seconds):
+        with self.lock:
+            self.samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    # Seconds after which a call for `key` counts as slow, or None while
+    # there are too few samples to tell
+    def deadline(self, key):
+        with self.lock:
+            samples = sorted(self.samples.get(key, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return max(self.min_delay, samples[min(len(samples) - 1, math.ceil(self.quantile * len(samples)) - 1)])
+
+
+# Each call earns `ratio` of a hedge, so hedges stay a bounded share of traffic
+class HedgeBudget:
+    def __init__(self, ratio=HEDGE_BUDGET, burst=5.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+        self.lock = threading.Lock()
+
+    def earn(self):
+        with self.lock:
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def spend(self):
+        with self.lock:
+            if self.tokens < 1.0:
+                return False
+            self.tokens -= 1.0
+            return True
+
+
+# closed: calls go through. open: calls fail fast with CircuitOpen until the
+# cooldown ends. half-open: one trial call decides whether to close again.
+class CircuitBreaker:
+    def __init__(self, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS,
+                 error_rate=BREAKER_ERROR_RATE, cooldown=BREAKER_COOLDOWN):
+        self.outcomes = deque(maxlen=window)
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.opened_at = None
+        # When the half-open trial call started; a trial that never reports
+        # back (e.g. cancelled) stops blocking after another cooldown
+        self.trial_started = None
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            return "open" if time.monotonic() - self.opened_at < self.cooldown else "half-open"
+
+    # Raise CircuitOpen unless a call may go ahead now
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            now = time.monotonic()
+            trial_pending = self.trial_started is not None and now - self.trial_started < self.cooldown
+            if now - self.opened_at >= self.cooldown and not trial_pending:
+                self.trial_started = now
+                return
+        raise CircuitOpen("The question generator is failing right now; please try again shortly.")
+
+    def record_success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                self.opened_at = None
+                self.trial_started = None
+                self.outcomes.clear()
+            self.outcomes.append(True)
+
+    def record_failure(self):
+        with self.lock:
+            if self.opened_at is not None:
+                # The half-open trial failed: start another cooldown
+                self.opened_at = time.monotonic()
+                self.trial_started = None
+                return
+            self.outcomes.append(False)
+            failures = self.outcomes.count(False)
+            if len(self.outcomes) >= self.min_calls and failures >= self.error_rate * len(self.outcomes):
+                self.opened_at = time.monotonic()
+
+
+POLL_SECONDS = 0.25
+_pool = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedged-call")
+
+# Wraps a release callback so that only its first call has any effect
+def release_once(release):
+    lock = threading.Lock()
+    released = []
+
+    def wrapper():
+        with lock:
+            if released:
+                return
+            released.append(True)
+        release()
+    return wrapper
+
+# Wait for the first of `futures` in short slices, calling poll() between
+# them so the waiting thread can give up (poll raises) at any time
+def _wait_first(futures, timeout=None, poll=None):
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        remaining = POLL_SECONDS if deadline is None else max(0.0, min(POLL_SECONDS, deadline - time.monotonic()))
+        done, _ = wait(futures, timeout=remaining, return_when=FIRST_COMPLETED)
+        if done or (deadline is not None and time.monotonic() >= deadline):
+            return done
+        if poll is not None:
+            poll()
+
+# Run call() in the pool and, if it is still running after `delay` seconds
+# (None: never), a second copy when start_hedge() returns a release callback
+# for it (None means no hedge right now). release_primary is called when the
+# first copy finishes, even if the hedge won. Returns (result, hedged).
+def run_hedged(call, delay, start_hedge, release_primary, poll=None):
+    primary = _pool.submit(call)
+    primary.add_done_callback(lambda _: release_primary())
+    if delay is None or _wait_first([primary], delay, poll):
+        _wait_first([primary], poll=poll)
+        return primary.result(), False
+    release_hedge = start_hedge()
+    if release_hedge is None:
+        _wait_first([primary], poll=poll)
+        return primary.result(), False
+    hedge = _pool.submit(call)
+    hedge.add_done_callback(lambda _: release_hedge())
+    done = _wait_first([primary, hedge], poll=poll)
+    for future in done:
+        if future.exception() is None:
+            return future.result(), True
+    # The first copy to finish failed; the other one is the last chance
+    other = hedge if primary in done else primary
+    _wait_first([other], poll=poll)
+    return other.result(), True
+
+
+latency_tracker = LatencyTracker()
+hedge_budget = HedgeBudget()
+breaker = CircuitBreaker()
@@ -0,0 +1,103 @@
+import argparse
+import csv
+import itertools
+import os
+import sqlite3
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from exporter import CSV_HEADER, VARIANT_COLUMN, csv_row_to_question
+from question_bank import DB_PATH, init_bank, question_to_row
+from quality import check_question
+
+# Rows handed to a worker at a time, and rows inserted per transaction
+IMPORT_BATCH_SIZE = 5000
+IMPORT_COMMIT_SIZE = 100000
+
+# Imported questions were already handed out once (that's how they got
+# exported), so they go in as served: available to sampling, never taken fresh
+INSERT_SQL = """
+    INSERT INTO questions (
+        subject, level, question_type, question,
+        option_a, option_b, option_c, option_d,
+        correct_answer, created_at, served_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+# Stream the data rows of exported CSV files in batches
+def read_batches(paths, batch_size=IMPORT_BATCH_SIZE):
+    for path in paths:
+        with open(path, newline="", encoding="utf-8") as csv_file:
+            reader = csv.reader(csv_file)
+            header = next(reader, None)
+            if header not in (CSV_HEADER, CSV_HEADER + [VARIANT_COLUMN]):
+                raise ValueError(f"{path} is not in the export_to_csv layout")
+            while True:
+                batch = list(itertools.islice(reader, batch_size))
+                if not batch:
+                    break
+                yield batch
+
+# Worker: parse and validate one batch into insert-ready rows
+def convert_batch(batch):
+    rows = []
+    rejected = 0
+    for csv_row in batch:
+        # Later variants of a multi-variant export repeat variant 1's questions
+        # (shuffled), so only variant 1 is imported
+        if len(csv_row) > len(CSV_HEADER) and csv_row[len(CSV_HEADER)] != "1":
+            continue
+        try:
+            question, subject, level = csv_row_to_question(csv_row)
+            question, reason = check_question(question)
+        except ValueError:
+            question = None
+        if question is None:
+            rejected += 1
+            continue
+        row = question_to_row(question, subject, level, question.qtype.value)
+        # served_at is the created_at time
+        rows.append(row + (row[9],))
+    return rows, rejected
+
+# Load exported CSV files into the question bank; returns (imported, rejected)
+def import_csv_files(paths, workers=None, batch_size=IMPORT_BATCH_SIZE, commit_size=IMPORT_COMMIT_SIZE):
+    init_bank()
+    imported = rejected = pending = 0
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Keep a bounded window of batches in flight so files are streamed, not loaded whole
+            window = (workers or os.cpu_count() or 1) * 2
+            in_flight = deque()
+            batches = read_batches(paths, batch_size)
+            while True:
+                for batch in itertools.islice(batches, window - len(in_flight)):
+                    in_flight.append(pool.submit(convert_batch, batch))
+                if not in_flight:
+                    break
+                rows, batch_rejected = in_flight.popleft().result()
+                cursor.executemany(INSERT_SQL, rows)
+                imported += len(rows)
+                rejected += batch_rejected
+                pending += len(rows)
+                if pending >= commit_size:
+                    conn.commit()
+                    pending = 0
+        conn.commit()
+    finally:
+        conn.close()
+    return imported, rejected
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import exported question CSV files into the bank")
+    parser.add_argument("paths", nargs="+", help="CSV files written by export_to_csv")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument("--commit-size", type=int, default=IMPORT_COMMIT_SIZE)
+    args = parser.parse_args()
+
+    imported, rejected = import_csv_files(args.paths, args.workers, args.batch_size, args.commit_size)
+    print(f"Imported {imported} questions, rejected {rejected}")
@@ -0,0 +1,176 @@
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import time
+from question_bank import DB_PATH, init_bank
+from questions import question_to_json, question_from_json
+
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+# Running jobs older than this are assumed to belong to a dead worker and are requeued
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "600"))
+
+# Generation job queue setup
+def init_jobs():
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS generation_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            subject TEXT NOT NULL,
+            level TEXT NOT NULL,
+            question_type TEXT NOT NULL,
+            number INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            result TEXT,
+            error TEXT,
+            worker TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            owner TEXT
+        )
+    """)
+    # Queues created before per-user quotas have no owner column
+    cursor.execute("PRAGMA table_info(generation_jobs)")
+    if "owner" not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE generation_jobs ADD COLUMN owner TEXT")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_generation_jobs_status
+        ON generation_jobs (status, id)
+    """)
+    conn.commit()
+    conn.close()
+
+def enqueue_job(subject, level, question_type, number, owner=None):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO generation_jobs (subject, level, question_type, number, created_at, owner)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (subject, level, question_type, number, time.time(), owner))
+    job_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return job_id
+
+# Returns (status, questions, error) for a job
+def fetch_job(job_id):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT status, result, error FROM generation_jobs WHERE id = ?", (job_id,))
+    row = cursor.fetchone()
+    conn.close()
+    if row is None:
+        return "missing", [], None
+    status, result, error = row
+    questions = [question_from_json(data) for data in json.loads(result)] if result else []
+    return status, questions, error
+
+# Atomically move the oldest queued job to running and return it
+def claim_job(worker):
+    conn = sqlite3.connect(DB_PATH, isolation_level=None, timeout=30)
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    cursor.execute("""
+        UPDATE generation_jobs SET status = 'queued', worker = NULL, started_at = NULL
+        WHERE status = 'running' AND started_at < ?
+    """, (time.time() - JOB_STALE_SECONDS,))
+    cursor.execute("""
+        SELECT id, subject, level, question_type, number, owner FROM generation_jobs
+        WHERE status = 'queued'
+        ORDER BY id
+        LIMIT 1
+    """)
+    row = cursor.fetchone()
+    if row is not None:
+        cursor.execute("""
+            UPDATE generation_jobs SET status = 'running', worker = ?, started_at = ?
+            WHERE id = ?
+        """, (worker, time.time(), row[0]))
+    cursor.execute("COMMIT")
+    conn.close()
+    return row
+
+# Cancelled jobs keep their status; the worker drops their result
+def finish_job(job_id, questions=None, error=None):
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE generation_jobs SET status = ?, result = ?, error = ?, finished_at = ?
+        WHERE id = ? AND status = 'running'
+    """, (
+        "failed" if error else "done",
+        None if error else json.dumps([question_to_json(q) for q in questions]),
+        error,
+        time.time(),
+        job_id
+    ))
+    conn.commit()
+    conn.close()
+
+# Cancel a queued or running job; a running one stops at its next check
+def cancel_job(job_id):
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE generation_jobs SET status = 'cancelled', finished_at = ?
+        WHERE id = ? AND status IN ('queued', 'running')
+    """, (time.time(), job_id))
+    conn.commit()
+    conn.close()
+
+def job_cancelled(job_id):
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    cursor = conn.cursor()
+    cursor.execute("SELECT status FROM generation_jobs WHERE id = ?", (job_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return row is None or row[0] == "cancelled"
+
+# Worker loop: claim, generate, store the result, repeat
+def run_worker(poll_interval=JOB_POLL_SECONDS):
+    # Imported here so the app can enqueue and poll without loading the SDK
+    from cancellation import CancelToken, GenerationCancelled
+    from generator import serve_questions
+    from scheduler import BATCH
+    from users import fetch_user
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    while True:
+        job = claim_job(worker)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        job_id, subject, level, question_type, number, owner = job
+        cancel = CancelToken()
+
+        # Called while the job waits for or runs a model call
+        def watch_cancel(position, job_id=job_id, cancel=cancel):
+            if job_cancelled(job_id):
+                cancel.cancel()
+
+        try:
+            # Jobs count against their owner's quota and fair share, at batch priority
+            user = fetch_user(owner) if owner else None
+            finish_job(job_id, serve_questions(subject, number, level, question_type, user=user, priority=BATCH,
+                                               on_wait=watch_cancel, cancel=cancel))
+        except GenerationCancelled:
+            pass
+        except Exception as exc:
+            finish_job(job_id, error=str(exc))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run generation job workers")
+    parser.add_argument("--workers", type=int, default=2, help="number of worker processes")
+    args = parser.parse_args()
+
+    init_bank()
+    init_jobs()
+    processes = [multiprocessing.Process(target=run_worker, daemon=True) for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
@@ -0,0 +1,129 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from generator import generate_planned_questions, generation_context
+from question_bank import init_bank, store_questions, count_fresh_questions
+from scheduler import BACKGROUND
+
+# Pre-generation settings (override through the environment / .env)
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "1") == "1"
+PREWARM_TARGET = int(os.getenv("PREWARM_TARGET", "30"))
+PREWARM_HOT_COMBINATIONS = int(os.getenv("PREWARM_HOT_COMBINATIONS", "5"))
+PREWARM_CHUNK = int(os.getenv("PREWARM_CHUNK", "10"))
+PREWARM_IDLE_SECONDS = float(os.getenv("PREWARM_IDLE_SECONDS", "20"))
+PREWARM_QUOTA_SHARE = float(os.getenv("PREWARM_QUOTA_SHARE", "0.2"))
+PREWARM_HALF_LIFE = float(os.getenv("PREWARM_HALF_LIFE", "1800"))
+GEMINI_REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "15"))
+
+logger = logging.getLogger(__name__)
+
+
+# Background thread that keeps the hottest (subject, level, question_type)
+# combinations stocked with fresh questions in the bank
+class PrewarmWorker(threading.Thread):
+    def __init__(self, target=PREWARM_TARGET, hot_combinations=PREWARM_HOT_COMBINATIONS,
+                 chunk=PREWARM_CHUNK, idle_seconds=PREWARM_IDLE_SECONDS,
+                 quota_share=PREWARM_QUOTA_SHARE, requests_per_minute=GEMINI_REQUESTS_PER_MINUTE,
+                 half_life=PREWARM_HALF_LIFE, poll_interval=5.0):
+        super().__init__(name="prewarm-worker", daemon=True)
+        self.target = target
+        self.hot_combinations = hot_combinations
+        self.chunk = chunk
+        self.idle_seconds = idle_seconds
+        self.half_life = half_life
+        self.poll_interval = poll_interval
+        # Calls per minute the worker may spend out of the shared API quota
+        self.call_budget = max(1, int(requests_per_minute * quota_share))
+        self.scores = {}
+        self.last_activity = 0.0
+        self.recent_calls = deque()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    # Count an interactive request; scores decay so the ranking follows recent demand
+    def record_request(self, subject, level, question_type):
+        now = time.time()
+        key = (subject, level, question_type)
+        with self.lock:
+            score, updated = self.scores.get(key, (0.0, now))
+            self.scores[key] = (self._decay(score, now - updated) + 1.0, now)
+            self.last_activity = now
+
+    # Mark the API as busy with interactive traffic
+    def note_activity(self):
+        with self.lock:
+            self.last_activity = time.time()
+
+    def hottest(self):
+        now = time.time()
+        with self.lock:
+            ranked = sorted(
+                self.scores.items(),
+                key=lambda item: self._decay(item[1][0], now - item[1][1]),
+                reverse=True
+            )
+        return [key for key, _ in ranked[:self.hot_combinations]]
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _decay(self, score, elapsed):
+        return score * 0.5 ** (elapsed / self.half_life)
+
+    def _is_idle(self):
+        with self.lock:
+            return time.time() - self.last_activity >= self.idle_seconds
+
+    def _has_budget(self):
+        now = time.time()
+        while self.recent_calls and now - self.recent_calls[0] > 60:
+            self.recent_calls.popleft()
+        return len(self.recent_calls) < self.call_budget
+
+    # Generate one chunk for the first hot combination that is below target
+    def refill_once(self):
+        for subject, level, question_type in self.hottest():
+            if not self._is_idle() or not self._has_budget():
+                return False
+            missing = self.target - count_fresh_questions(subject, level, question_type)
+            if missing <= 0:
+                continue
+            # Background class: interactive and batch calls get free slots first
+            with generation_context(priority=BACKGROUND) as context:
+                try:
+                    questions = generate_planned_questions(subject, min(missing, self.chunk), level, question_type)
+                finally:
+                    # One refill can take several calls (planner chunks, shortfall
+                    # retries); each of them counts against the budget
+                    now = time.time()
+                    self.recent_calls.extend([now] * context.calls)
+            store_questions(subject, level, question_type, questions)
+            return True
+        return False
+
+    def run(self):
+        init_bank()
+        while not self.stop_event.is_set():
+            try:
+                refilled = self.refill_once()
+            except Exception:
+                logger.exception("Pre-generation failed")
+                refilled = False
+            if not refilled:
+                self.stop_event.wait(self.poll_interval)
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+# Start the process-wide worker once; Streamlit reruns keep reusing it
+def get_prewarm_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = PrewarmWorker()
+            if PREWARM_ENABLED:
+                _worker.start()
+        return _worker
@@ -0,0 +1,99 @@
+import contextlib
+import cProfile
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+
+
+# Samples one thread's stack on a timer and counts collapsed stacks
+# ("outer;inner;leaf count"), the input format of flamegraph tools
+class StackSampler(threading.Thread):
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+
+    def write(self, path):
+        with open(path, "w") as collapsed:
+            for stack, count in self.stacks.most_common():
+                collapsed.write(f"{stack} {count}\n")
+
+
+# Profiles the next N reruns of the app script (or of a fragment, which
+# reruns on its own) when an admin asks for it. While nothing is armed,
+# profile_rerun only checks a counter.
+class RerunProfiler:
+    def __init__(self, profile_dir=PROFILE_DIR):
+        self.profile_dir = profile_dir
+        self.remaining = 0
+        self.sequence = itertools.count(1)
+        self.lock = threading.Lock()
+        # Set while this thread's rerun is being profiled, so a fragment run
+        # as part of a full rerun is recorded in that rerun's profile
+        self.active = threading.local()
+
+    def arm(self, reruns):
+        with self.lock:
+            self.remaining = reruns
+
+    def _take(self):
+        with self.lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+    @contextlib.contextmanager
+    def profile_rerun(self):
+        if getattr(self.active, "profiling", False) or not self.remaining or not self._take():
+            yield
+            return
+        self.active.profiling = True
+        profile = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident())
+        sampler.start()
+        profile.enable()
+        try:
+            yield
+        finally:
+            # Reruns and st.stop() end the script with an exception; still save
+            profile.disable()
+            sampler.stop()
+            self.active.profiling = False
+            os.makedirs(self.profile_dir, exist_ok=True)
+            base = os.path.join(self.profile_dir, f"rerun-{time.strftime('%Y%m%d-%H%M%S')}-{next(self.sequence)}")
+            profile.dump_stats(base + ".pstats")
+            sampler.write(base + ".collapsed")
+
+    # Saved profile files, newest first
+    def saved_profiles(self, limit=20):
+        if not os.path.isdir(self.profile_dir):
+            return []
+        paths = [os.path.join(self.profile_dir, name) for name in os.listdir(self.profile_dir)]
+        return sorted(paths, key=os.path.getmtime, reverse=True)[:limit]
+
+
+rerun_profiler = RerunProfiler()
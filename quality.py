@@ -0,0 +1,62 @@
+import re
+import threading
+from collections import Counter
+from questions import OPTION_LETTERS, QuestionType, make_question
+
+# Stems and options that are just the prompt's format placeholders echoed back
+PLACEHOLDER_STEM = re.compile(r"^\s*(\d+\.\s*)?(question\s*\??|\[?question\]?\??|\.\.\.)\s*$", re.IGNORECASE)
+PLACEHOLDER_OPTION = re.compile(r"^\s*\[?option\s*\d?\]?\s*$", re.IGNORECASE)
+# Markdown emphasis the model sometimes wraps around stems and options
+EMPHASIS = re.compile(r"^[*_]+|[*_]+$")
+
+# Running totals of rejected questions per reason, for monitoring
+rejection_counts = Counter()
+_rejection_lock = threading.Lock()
+
+
+def _clean(text):
+    return EMPHASIS.sub("", text or "").strip()
+
+# Returns (question, None) when the question passes, possibly repaired, or
+# (None, reason) when it has to be regenerated
+def check_question(question):
+    text = _clean(question.text)
+    if not text or PLACEHOLDER_STEM.match(text):
+        return None, "placeholder stem"
+
+    if question.qtype is QuestionType.TRUE_FALSE:
+        if question.answer not in ("True", "False"):
+            return None, "invalid answer"
+        return make_question(question.qtype, text, answer=question.answer), None
+
+    options = tuple(_clean(option) for option in (question.a, question.b, question.c, question.d))
+    if not all(options):
+        return None, "empty option"
+    if any(PLACEHOLDER_OPTION.match(option) for option in options):
+        return None, "placeholder option"
+    if len({option.lower() for option in options}) < len(options):
+        return None, "duplicate options"
+
+    # Keep only real option letters, in order and without repeats
+    letters = [letter for letter in OPTION_LETTERS if letter in question.correct_letters]
+    if not letters:
+        return None, "invalid answer"
+    if question.qtype is QuestionType.MCQ and len(letters) != 1:
+        return None, "invalid answer"
+    return make_question(question.qtype, text, options, ", ".join(letters)), None
+
+# Batch validation run right after parsing. Rejected questions are dropped;
+# the caller's shortfall recovery regenerates just those slots.
+def validate_questions(questions):
+    accepted = []
+    rejected = Counter()
+    for question in questions:
+        checked, reason = check_question(question)
+        if checked is None:
+            rejected[reason] += 1
+        else:
+            accepted.append(checked)
+    if rejected:
+        with _rejection_lock:
+            rejection_counts.update(rejected)
+    return accepted, rejected
@@ -0,0 +1,326 @@
+import random
+import sqlite3
+import time
+from questions import make_question
+
+DB_PATH = "questions_db.sqlite"
+
+# Question bank setup
+def init_bank():
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            subject TEXT NOT NULL,
+            level TEXT NOT NULL,
+            question_type TEXT NOT NULL,
+            question TEXT NOT NULL,
+            option_a TEXT,
+            option_b TEXT,
+            option_c TEXT,
+            option_d TEXT,
+            correct_answer TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            served_at REAL,
+            stratum_rank INTEGER
+        )
+    """)
+    # Banks created before stratum_rank existed: add it and number the rows
+    # of each (subject, level, question_type) 1, 2, 3, ... in id order
+    cursor.execute("PRAGMA table_info(questions)")
+    if "stratum_rank" not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE questions ADD COLUMN stratum_rank INTEGER")
+        cursor.execute("""
+            UPDATE questions SET stratum_rank = ranked.stratum_rank
+            FROM (
+                SELECT id, ROW_NUMBER() OVER (PARTITION BY subject, level, question_type ORDER BY id) AS stratum_rank
+                FROM questions
+            ) AS ranked
+            WHERE questions.id = ranked.id
+        """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_questions_stock
+        ON questions (subject, level, question_type, served_at)
+    """)
+    # Lets the sampler go straight to the row at a random rank of one stratum
+    cursor.execute("DROP INDEX IF EXISTS idx_questions_stratum")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_questions_stratum_rank
+        ON questions (subject, level, question_type, stratum_rank)
+    """)
+    # Every new row gets the next rank of its stratum, however ids of other
+    # strata interleave with it (inserts are serialized, so ranks are unique)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS questions_stratum_rank AFTER INSERT ON questions
+        BEGIN
+            UPDATE questions SET stratum_rank = (
+                SELECT COALESCE(MAX(stratum_rank), 0) + 1 FROM questions
+                WHERE subject = NEW.subject AND level = NEW.level AND question_type = NEW.question_type
+            )
+            WHERE id = NEW.id;
+        END
+    """)
+    # Assembled quizzes, so later quizzes can avoid repeating their questions
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS quizzes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            owner TEXT,
+            created_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS quiz_questions (
+            quiz_id INTEGER NOT NULL REFERENCES quizzes (id),
+            question_id INTEGER NOT NULL,
+            PRIMARY KEY (quiz_id, question_id)
+        ) WITHOUT ROWID
+    """)
+    # Per-combination counts kept up to date by triggers, so coverage views
+    # never need a GROUP BY over the whole bank
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS question_stats (
+            subject TEXT NOT NULL,
+            level TEXT NOT NULL,
+            question_type TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            fresh INTEGER NOT NULL DEFAULT 0,
+            newest_at REAL,
+            PRIMARY KEY (subject, level, question_type)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS question_stats_insert AFTER INSERT ON questions
+        BEGIN
+            INSERT INTO question_stats (subject, level, question_type, total, fresh, newest_at)
+            VALUES (NEW.subject, NEW.level, NEW.question_type, 1, NEW.served_at IS NULL, NEW.created_at)
+            ON CONFLICT (subject, level, question_type) DO UPDATE SET
+                total = total + 1,
+                fresh = fresh + excluded.fresh,
+                newest_at = MAX(COALESCE(newest_at, 0), excluded.newest_at);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS question_stats_delete AFTER DELETE ON questions
+        BEGIN
+            UPDATE question_stats SET
+                total = total - 1,
+                fresh = fresh - (OLD.served_at IS NULL)
+            WHERE subject = OLD.subject AND level = OLD.level AND question_type = OLD.question_type;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS question_stats_serve AFTER UPDATE OF served_at ON questions
+        BEGIN
+            UPDATE question_stats SET
+                fresh = fresh + (NEW.served_at IS NULL) - (OLD.served_at IS NULL)
+            WHERE subject = OLD.subject AND level = OLD.level AND question_type = OLD.question_type;
+        END
+    """)
+    # One-off backfill for banks created before the stats table existed
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM question_stats)")
+    if not cursor.fetchone()[0]:
+        cursor.execute("""
+            INSERT INTO question_stats (subject, level, question_type, total, fresh, newest_at)
+            SELECT subject, level, question_type, COUNT(*), SUM(served_at IS NULL), MAX(created_at)
+            FROM questions
+            GROUP BY subject, level, question_type
+        """)
+    conn.commit()
+    conn.close()
+
+# Convert a parsed question into a questions row
+def question_to_row(question, subject, level, question_type):
+    return (
+        subject,
+        level,
+        question_type,
+        question.text,
+        question.a,
+        question.b,
+        question.c,
+        question.d,
+        question.answer,
+        time.time()
+    )
+
+# Convert a questions row back into a question record
+def row_to_question(row, question_type):
+    question_text, option_a, option_b, option_c, option_d, correct_answer = row
+    options = None if question_type == "True/False" else (option_a, option_b, option_c, option_d)
+    return make_question(question_type, question_text, options, correct_answer)
+
+def store_questions(subject, level, question_type, questions):
+    if not questions:
+        return 0
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.executemany("""
+        INSERT INTO questions (
+            subject, level, question_type, question,
+            option_a, option_b, option_c, option_d,
+            correct_answer, created_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [question_to_row(q, subject, level, question_type) for q in questions])
+    conn.commit()
+    conn.close()
+    return len(questions)
+
+def count_fresh_questions(subject, level, question_type):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT fresh FROM question_stats
+        WHERE subject = ? AND level = ? AND question_type = ?
+    """, (subject, level, question_type))
+    row = cursor.fetchone()
+    conn.close()
+    return row[0] if row else 0
+
+# Stock counts per combination, read from the materialized stats
+def fetch_bank_stats(subject=None, level=None):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT subject, level, question_type, total, fresh, newest_at
+        FROM question_stats
+        WHERE total > 0 AND (? IS NULL OR subject = ?) AND (? IS NULL OR level = ?)
+        ORDER BY subject, level, question_type
+    """, (subject, subject, level, level))
+    stats = [
+        {"subject": row[0], "level": row[1], "question_type": row[2],
+         "total": row[3], "fresh": row[4], "newest_at": row[5]}
+        for row in cursor.fetchall()
+    ]
+    conn.close()
+    return stats
+
+# Take up to `number` fresh questions from stock and mark them as served.
+# Returns (row ids, questions); the ids let restock_questions undo the take.
+def take_questions(subject, level, question_type, number):
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    cursor = conn.cursor()
+    # Lock before reading so two sessions never take the same questions
+    cursor.execute("BEGIN IMMEDIATE")
+    cursor.execute("""
+        SELECT id, question, option_a, option_b, option_c, option_d, correct_answer
+        FROM questions
+        WHERE subject = ? AND level = ? AND question_type = ? AND served_at IS NULL
+        ORDER BY id
+        LIMIT ?
+    """, (subject, level, question_type, number))
+    rows = cursor.fetchall()
+    cursor.executemany(
+        "UPDATE questions SET served_at = ? WHERE id = ?",
+        [(time.time(), row[0]) for row in rows]
+    )
+    cursor.execute("COMMIT")
+    conn.close()
+    return [row[0] for row in rows], [row_to_question(row[1:], question_type) for row in rows]
+
+# Put taken questions back in stock, e.g. when the request they were taken
+# for is cancelled
+def restock_questions(question_ids):
+    if not question_ids:
+        return
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.executemany("UPDATE questions SET served_at = NULL WHERE id = ?", [(question_id,) for question_id in question_ids])
+    conn.commit()
+    conn.close()
+
+# Question IDs used by the owner's most recent quizzes
+def recent_quiz_question_ids(last_quizzes, owner=None):
+    if last_quizzes <= 0:
+        return set()
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT question_id FROM quiz_questions
+        WHERE quiz_id IN (
+            SELECT id FROM quizzes WHERE owner IS ?
+            ORDER BY id DESC
+            LIMIT ?
+        )
+    """, (owner, last_quizzes))
+    ids = {row[0] for row in cursor.fetchall()}
+    conn.close()
+    return ids
+
+def record_quiz(question_ids, owner=None):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO quizzes (owner, created_at) VALUES (?, ?)", (owner, time.time()))
+    quiz_id = cursor.lastrowid
+    cursor.executemany(
+        "INSERT OR IGNORE INTO quiz_questions (quiz_id, question_id) VALUES (?, ?)",
+        [(quiz_id, question_id) for question_id in question_ids]
+    )
+    conn.commit()
+    conn.close()
+    return quiz_id
+
+QUESTION_COLUMNS = "id, question, option_a, option_b, option_c, option_d, correct_answer"
+
+# Draw `count` distinct questions from one stratum without ORDER BY RANDOM():
+# pick a random rank up to the stratum's highest and look that row up, one
+# index lookup regardless of bank size. Ranks are dense within the stratum,
+# so every row is equally likely; a rank freed by a deleted row just misses.
+def _sample_stratum(cursor, subject, level, question_type, count, exclude, rng):
+    key = (subject, level, question_type)
+    cursor.execute("""
+        SELECT MAX(stratum_rank) FROM questions
+        WHERE subject = ? AND level = ? AND question_type = ?
+    """, key)
+    high = cursor.fetchone()[0]
+    if high is None:
+        return []
+    cursor.execute("SELECT total FROM question_stats WHERE subject = ? AND level = ? AND question_type = ?", key)
+    row = cursor.fetchone()
+    total = row[0] if row else 0
+
+    # Small strata: read them whole and sample in memory
+    if total <= 4 * (count + len(exclude)):
+        cursor.execute(f"""
+            SELECT {QUESTION_COLUMNS} FROM questions
+            WHERE subject = ? AND level = ? AND question_type = ?
+        """, key)
+        rows = [row for row in cursor.fetchall() if row[0] not in exclude]
+        return rng.sample(rows, min(count, len(rows)))
+
+    picked = {}
+    attempts = 0
+    while len(picked) < count and attempts < count * 20:
+        attempts += 1
+        cursor.execute(f"""
+            SELECT {QUESTION_COLUMNS} FROM questions
+            WHERE subject = ? AND level = ? AND question_type = ? AND stratum_rank = ?
+        """, key + (rng.randint(1, high),))
+        row = cursor.fetchone()
+        if row is not None and row[0] not in exclude and row[0] not in picked:
+            picked[row[0]] = row
+    return list(picked.values())
+
+# Up to `count` random questions of one combination, served or not
+def sample_questions(subject, level, question_type, count, rng=None):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    rows = _sample_stratum(cursor, subject, level, question_type, count, set(), rng or random.Random())
+    conn.close()
+    return [row_to_question(row[1:], question_type) for row in rows]
+
+# Assemble a quiz from the bank, e.g. [("Chemistry", "Silver", "MCQs", 10),
+# ("Chemistry", "Gold", "MCQs", 5)], skipping questions from the owner's last
+# `exclude_last` quizzes. Returns (quiz_id, [(question_id, question), ...]).
+def sample_quiz(strata, exclude_last=3, owner=None, rng=None):
+    rng = rng or random.Random()
+    exclude = recent_quiz_question_ids(exclude_last, owner)
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    sampled = []
+    for subject, level, question_type, count in strata:
+        for row in _sample_stratum(cursor, subject, level, question_type, count, exclude, rng):
+            sampled.append((row[0], row_to_question(row[1:], question_type)))
+    conn.close()
+    quiz_id = record_quiz([question_id for question_id, _ in sampled], owner) if sampled else None
+    return quiz_id, sampled
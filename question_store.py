@@ -0,0 +1,112 @@
+import itertools
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+QUESTION_STORE_MAX_BYTES = int(os.getenv("QUESTION_STORE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+def question_size(question):
+    return sys.getsizeof(question) + sum(sys.getsizeof(field) for field in question if isinstance(field, str))
+
+
+# Process-wide store for question payloads. Sessions keep only the IDs and
+# hold a reference on each one; entries are kept in LRU order and evicted
+# once the store goes over its memory cap, unreferenced entries first. If
+# stale sessions still pin too much, referenced entries are evicted too and
+# those sessions simply see the IDs disappear.
+class QuestionStore:
+    def __init__(self, max_bytes=QUESTION_STORE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.ids_by_question = {}
+        self.total_bytes = 0
+        self.next_id = itertools.count(1)
+
+    # Store questions and return their IDs; identical records share one entry.
+    # With acquire=True the caller's reference is taken before eviction runs,
+    # so the new entries can't be the ones evicted.
+    def add(self, questions, acquire=False):
+        ids = []
+        with self.lock:
+            for question in questions:
+                question_id = self.ids_by_question.get(question)
+                if question_id is None:
+                    question_id = next(self.next_id)
+                    size = question_size(question)
+                    self.entries[question_id] = [question, 0, size]
+                    self.ids_by_question[question] = question_id
+                    self.total_bytes += size
+                else:
+                    self.entries.move_to_end(question_id)
+                if acquire:
+                    self.entries[question_id][1] += 1
+                ids.append(question_id)
+            self._evict(protected=set(ids))
+        return ids
+
+    def acquire(self, ids):
+        with self.lock:
+            for question_id in ids:
+                entry = self.entries.get(question_id)
+                if entry is not None:
+                    entry[1] += 1
+
+    def release(self, ids):
+        with self.lock:
+            for question_id in ids:
+                entry = self.entries.get(question_id)
+                if entry is not None and entry[1] > 0:
+                    entry[1] -= 1
+            self._evict()
+
+    # Look up questions by ID, skipping any that have been evicted
+    def get(self, ids):
+        questions = []
+        with self.lock:
+            for question_id in ids:
+                entry = self.entries.get(question_id)
+                if entry is not None:
+                    self.entries.move_to_end(question_id)
+                    questions.append(entry[0])
+        return questions
+
+    # Like get, but paired with the IDs that are still present
+    def items(self, ids):
+        pairs = []
+        with self.lock:
+            for question_id in ids:
+                entry = self.entries.get(question_id)
+                if entry is not None:
+                    self.entries.move_to_end(question_id)
+                    pairs.append((question_id, entry[0]))
+        return pairs
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.total_bytes, "max_bytes": self.max_bytes}
+
+    def _remove(self, question_id):
+        question, _, size = self.entries.pop(question_id)
+        del self.ids_by_question[question]
+        self.total_bytes -= size
+
+    # Unreferenced entries go first, then referenced ones in LRU order;
+    # `protected` entries (the ones just added) are never evicted
+    def _evict(self, protected=()):
+        if self.total_bytes <= self.max_bytes:
+            return
+        candidates = [qid for qid in self.entries if qid not in protected]
+        for question_id in [qid for qid in candidates if self.entries[qid][1] == 0]:
+            self._remove(question_id)
+            if self.total_bytes <= self.max_bytes:
+                return
+        for question_id in [qid for qid in candidates if qid in self.entries]:
+            self._remove(question_id)
+            if self.total_bytes <= self.max_bytes:
+                return
+
+
+question_store = QuestionStore()
@@ -0,0 +1,54 @@
+import sys
+from collections import namedtuple
+from enum import Enum
+
+OPTION_LETTERS = ("a", "b", "c", "d")
+
+
+# Question types; the values are the labels used in the UI and the CSV export
+class QuestionType(str, Enum):
+    MCQ = "MCQs"
+    TRUE_FALSE = "True/False"
+    MULTIPLE = "Multiple Correct Answers"
+
+
+# Compact, immutable question record. It is a plain tuple with no per-instance
+# __dict__: the type is a shared enum member, the four options live in fixed
+# slots (None for True/False), and the answer is an interned string such as
+# "b", "True" or "a, c" so identical answers share one object.
+class Question(namedtuple("Question", "text qtype a b c d answer")):
+    __slots__ = ()
+
+    @property
+    def options(self):
+        if self.qtype is QuestionType.TRUE_FALSE:
+            return ()
+        return tuple(zip(OPTION_LETTERS, (self.a, self.b, self.c, self.d)))
+
+    @property
+    def correct_letters(self):
+        if self.qtype is QuestionType.TRUE_FALSE:
+            return ()
+        return tuple(letter.strip() for letter in self.answer.split(","))
+
+    def is_correct(self, letter):
+        return letter in self.correct_letters
+
+
+def make_question(question_type, text, options=None, answer=""):
+    qtype = QuestionType(question_type)
+    if qtype is QuestionType.MULTIPLE:
+        letters = answer.split(",") if isinstance(answer, str) else answer
+        answer = ", ".join(letter.strip() for letter in letters)
+    a, b, c, d = options if options else (None, None, None, None)
+    return Question(text, qtype, a, b, c, d, sys.intern(answer.strip()))
+
+
+# Plain list form for JSON storage (job results, cassettes)
+def question_to_json(question):
+    return [question.text, question.qtype.value, question.a, question.b, question.c, question.d, question.answer]
+
+def question_from_json(data):
+    text, question_type, a, b, c, d, answer = data
+    options = None if question_type == QuestionType.TRUE_FALSE.value else (a, b, c, d)
+    return make_question(question_type, text, options, answer)
@@ -0,0 +1,323 @@
+import asyncio
+import contextlib
+import itertools
+import os
+import sqlite3
+import threading
+import time
+
+# Model calls that may run at once across every process sharing SCHEDULER_DB_PATH
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "4"))
+# Per-user token bucket for a weight of 1.0: refill rate and burst size, in requests
+USER_REQUESTS_PER_MINUTE = float(os.getenv("USER_REQUESTS_PER_MINUTE", "6"))
+USER_BURST = float(os.getenv("USER_BURST", "3"))
+WAIT_POLL_SECONDS = 0.5
+# Scheduler state shared by the app replicas and job workers; it must be on
+# a filesystem all of them can lock
+SCHEDULER_DB_PATH = os.getenv("SCHEDULER_DB_PATH", "scheduler_state.sqlite")
+# A slot held by a process that died frees itself after this long
+LEASE_SECONDS = float(os.getenv("SCHEDULER_LEASE_SECONDS", "300"))
+# A process's waiting requests hold back other processes' less urgent work
+# until it has not refreshed them for this long
+WAITING_SECONDS = 4 * WAIT_POLL_SECONDS
+
+# Priority classes, most urgent first
+INTERACTIVE = 0
+BATCH = 1
+BACKGROUND = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch", BACKGROUND: "background"}
+# Slots only interactive work may take, so a running batch can't fill every slot
+INTERACTIVE_RESERVED_SLOTS = int(os.getenv("INTERACTIVE_RESERVED_SLOTS", "1"))
+# A waiting request moves up one class for every AGING_SECONDS it has waited
+AGING_SECONDS = float(os.getenv("SCHEDULER_AGING_SECONDS", "30"))
+
+
+class Ticket:
+    def __init__(self, user, weight, cost, priority, sequence):
+        self.user = user
+        self.weight = weight
+        self.cost = cost
+        self.priority = priority
+        self.sequence = sequence
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.lease = None
+
+
+# Deployment-wide scheduler state in SQLite: the running calls (as leases
+# with an expiry), each user's token bucket, and the most urgent priority
+# each process has waiting. A grant is decided in one BEGIN IMMEDIATE
+# transaction, so processes can't oversubscribe the slots or a bucket.
+class SlotTable:
+    def __init__(self, path=SCHEDULER_DB_PATH, slots=GEMINI_CONCURRENCY, requests_per_minute=USER_REQUESTS_PER_MINUTE,
+                 burst=USER_BURST, reserved_slots=INTERACTIVE_RESERVED_SLOTS):
+        self.path = path
+        self.slots = slots
+        self.reserved_slots = min(reserved_slots, slots - 1)
+        self.rate = requests_per_minute / 60.0
+        self.burst = burst
+        self.ready = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        # The state only matters while processes are running; no need to fsync it
+        conn.execute("PRAGMA synchronous = OFF")
+        if not self.ready:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS model_leases (
+                    lease TEXT PRIMARY KEY,
+                    priority INTEGER NOT NULL,
+                    expires_at REAL NOT NULL
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS rate_buckets (
+                    user TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS waiting_priorities (
+                    scheduler TEXT PRIMARY KEY,
+                    priority INTEGER NOT NULL,
+                    seen_at REAL NOT NULL
+                ) WITHOUT ROWID;
+            """)
+            self.ready = True
+        return conn
+
+    def _bucket_tokens(self, cursor, user, weight, now):
+        cursor.execute("SELECT tokens, updated_at FROM rate_buckets WHERE user = ?", (user,))
+        tokens, updated = cursor.fetchone() or (self.burst * weight, now)
+        return min(self.burst * weight, tokens + max(0.0, now - updated) * self.rate * weight)
+
+    # Grant a slot to the first of `candidates` ((ticket, priority) pairs, most
+    # deserving first) that may run now, and return it with its lease; None if
+    # none may. A candidate left waiting is published under `scheduler` so other
+    # processes hold back less urgent work for it. Requests without a user
+    # (system work) and follow-up calls of an already-charged request have a
+    # cost of 0 and skip the bucket.
+    def grant(self, scheduler, candidates):
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("DELETE FROM model_leases WHERE expires_at <= ?", (now,))
+            cursor.execute("SELECT COUNT(*) FROM model_leases")
+            free_slots = self.slots - cursor.fetchone()[0]
+            cursor.execute("SELECT MIN(priority) FROM waiting_priorities WHERE scheduler != ? AND seen_at > ?",
+                           (scheduler, now - WAITING_SECONDS))
+            waiting_elsewhere = cursor.fetchone()[0]
+            granted = waiting = None
+            for ticket, priority in candidates:
+                if ticket.cost:
+                    tokens = self._bucket_tokens(cursor, ticket.user, ticket.weight, now)
+                    if tokens < ticket.cost:
+                        continue
+                slot_free = free_slots > self.reserved_slots or (free_slots > 0 and priority == INTERACTIVE)
+                if not slot_free or (waiting_elsewhere is not None and waiting_elsewhere < priority):
+                    # Candidates are ordered by priority, so none after this one can run either
+                    waiting = priority
+                    break
+                lease = os.urandom(8).hex()
+                cursor.execute("INSERT INTO model_leases (lease, priority, expires_at) VALUES (?, ?, ?)",
+                               (lease, priority, now + LEASE_SECONDS))
+                if ticket.cost:
+                    cursor.execute("""
+                        INSERT INTO rate_buckets (user, tokens, updated_at) VALUES (?, ?, ?)
+                        ON CONFLICT (user) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at
+                    """, (ticket.user, tokens - ticket.cost, now))
+                granted = (ticket, lease)
+                break
+            if waiting is None:
+                cursor.execute("DELETE FROM waiting_priorities WHERE scheduler = ?", (scheduler,))
+            else:
+                cursor.execute("""
+                    INSERT INTO waiting_priorities (scheduler, priority, seen_at) VALUES (?, ?, ?)
+                    ON CONFLICT (scheduler) DO UPDATE SET priority = excluded.priority, seen_at = excluded.seen_at
+                """, (scheduler, waiting, now))
+            cursor.execute("COMMIT")
+            return granted
+        finally:
+            conn.close()
+
+    def release(self, lease):
+        conn = self._connect()
+        conn.execute("DELETE FROM model_leases WHERE lease = ?", (lease,))
+        conn.close()
+
+    # Stop holding back other processes: nothing is waiting here any more
+    def withdraw(self, scheduler):
+        conn = self._connect()
+        conn.execute("DELETE FROM waiting_priorities WHERE scheduler = ?", (scheduler,))
+        conn.close()
+
+    # Model calls running across the deployment right now
+    def running(self):
+        conn = self._connect()
+        row = conn.execute("SELECT COUNT(*) FROM model_leases WHERE expires_at > ?", (time.time(),)).fetchone()
+        conn.close()
+        return row[0]
+
+
+# Fair-share scheduler in front of the model. Slots and each user's token
+# bucket (scaled by their weight, so nobody can take more than their share of
+# requests per minute) are shared by every process through a SlotTable. Free
+# slots go to the most urgent priority class first, in this process and
+# across processes, and within a class to the eligible request with the
+# lowest virtual start time (start-time fair queuing), so heavy users queue
+# behind light ones rather than ahead of them. Slots are held for a single
+# model call, so a long batch yields to interactive work between its calls.
+class FairScheduler:
+    def __init__(self, slots=GEMINI_CONCURRENCY, requests_per_minute=USER_REQUESTS_PER_MINUTE, burst=USER_BURST,
+                 reserved_slots=INTERACTIVE_RESERVED_SLOTS, aging_seconds=AGING_SECONDS, path=SCHEDULER_DB_PATH):
+        self.condition = threading.Condition()
+        self.table = SlotTable(path, slots, requests_per_minute, burst, reserved_slots)
+        self.name = os.urandom(8).hex()
+        self.aging_seconds = aging_seconds
+        self.waiting = []
+        self.published = False
+        self.virtual_finish = {}
+        self.virtual_time = 0.0
+        self.sequence = itertools.count()
+
+    def _start_tag(self, ticket):
+        return max(self.virtual_time, self.virtual_finish.get(ticket.user, 0.0))
+
+    # Priority class after aging, so low-priority work can't starve
+    def _effective_priority(self, ticket, now):
+        if not self.aging_seconds:
+            return ticket.priority
+        return max(INTERACTIVE, ticket.priority - int((now - ticket.enqueued) / self.aging_seconds))
+
+    def _dispatch(self):
+        now = time.monotonic()
+        while self.waiting:
+            candidates = sorted(((t, self._effective_priority(t, now)) for t in self.waiting),
+                                key=lambda pair: (pair[1], self._start_tag(pair[0]), pair[0].sequence))
+            self.published = True
+            granted = self.table.grant(self.name, candidates)
+            if granted is None:
+                return
+            ticket, ticket.lease = granted
+            start = self._start_tag(ticket)
+            self.virtual_finish[ticket.user] = start + 1.0 / ticket.weight
+            self.virtual_time = start
+            self.waiting.remove(ticket)
+            ticket.granted = True
+            self.condition.notify_all()
+        self._withdraw()
+
+    def _withdraw(self):
+        if self.published and not self.waiting:
+            self.table.withdraw(self.name)
+            self.published = False
+
+    # 1-based place in line, assuming every waiting user stays eligible
+    def _position(self, ticket):
+        now = time.monotonic()
+        finish = dict(self.virtual_finish)
+        tags = []
+        for waiting in sorted(self.waiting, key=lambda t: t.sequence):
+            start = max(self.virtual_time, finish.get(waiting.user, 0.0))
+            finish[waiting.user] = start + 1.0 / waiting.weight
+            tags.append((self._effective_priority(waiting, now), start, waiting.sequence, waiting))
+        tags.sort(key=lambda tag: tag[:3])
+        return next(index for index, tag in enumerate(tags, start=1) if tag[3] is ticket)
+
+    def _enqueue(self, user, weight, cost, priority):
+        with self.condition:
+            ticket = Ticket(user, weight, cost, priority, next(self.sequence))
+            self.waiting.append(ticket)
+            return ticket
+
+    # Give up our place (or the slot we were just granted) on timeout or abort
+    def _abandon(self, ticket):
+        with self.condition:
+            if ticket.granted:
+                self.table.release(ticket.lease)
+            else:
+                self.waiting.remove(ticket)
+                self._withdraw()
+            self.condition.notify_all()
+
+    # Block until a slot is granted; on_wait(position) is called while queued
+    def acquire(self, user, weight=1.0, cost=1.0, timeout=None, on_wait=None, priority=INTERACTIVE):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        ticket = self._enqueue(user, weight, cost, priority)
+        try:
+            while True:
+                with self.condition:
+                    self._dispatch()
+                    if ticket.granted:
+                        return ticket
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise TimeoutError("Timed out waiting for generation capacity")
+                    position = self._position(ticket)
+                    # Slots freed by other processes are only seen on the next poll
+                    self.condition.wait(WAIT_POLL_SECONDS)
+                if on_wait is not None:
+                    on_wait(position)
+        except BaseException:
+            self._abandon(ticket)
+            raise
+
+    def _try_grant(self, ticket):
+        with self.condition:
+            self._dispatch()
+            return ticket.granted
+
+    # acquire() for event loops: the condition lock and the state file's
+    # transactions can block, so they run in worker threads, never on the
+    # loop. Gives up its place when the awaiting task is cancelled.
+    async def acquire_async(self, user, weight=1.0, cost=1.0, priority=INTERACTIVE):
+        ticket = self._enqueue(user, weight, cost, priority)
+        try:
+            while not await asyncio.to_thread(self._try_grant, ticket):
+                await asyncio.sleep(WAIT_POLL_SECONDS)
+            return ticket
+        except BaseException:
+            await asyncio.to_thread(self._abandon, ticket)
+            raise
+
+    async def release_async(self, ticket):
+        await asyncio.to_thread(self.release, ticket)
+
+    # Take a slot only if it can be granted right away, otherwise None
+    def try_acquire(self, user, weight=1.0, cost=1.0, priority=INTERACTIVE):
+        try:
+            return self.acquire(user, weight, cost, timeout=0, priority=priority)
+        except TimeoutError:
+            return None
+
+    def release(self, ticket):
+        with self.condition:
+            self.table.release(ticket.lease)
+            self.condition.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self, user, weight=1.0, cost=1.0, timeout=None, on_wait=None, priority=INTERACTIVE):
+        ticket = self.acquire(user, weight, cost, timeout, on_wait, priority)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    # Calls non-interactive work can have running at once across the
+    # deployment: the slots not reserved for interactive requests
+    def batch_capacity(self):
+        return self.table.slots - self.table.reserved_slots
+
+    def queue_length(self):
+        with self.condition:
+            return len(self.waiting)
+
+    # Waiting requests per priority class name, for status displays
+    def queue_lengths(self):
+        with self.condition:
+            lengths = {name: 0 for name in PRIORITY_NAMES.values()}
+            for ticket in self.waiting:
+                lengths[PRIORITY_NAMES[ticket.priority]] += 1
+            return lengths
+
+
+scheduler = FairScheduler()
@@ -0,0 +1,328 @@
+import abc
+import argparse
+import hashlib
+import json
+import logging
+import os
+import socket
+import socketserver
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+# Where replicas coordinate identical model calls that run at the same time:
+# "sqlite:///cache.sqlite" (three slashes: relative path, four: absolute),
+# "redis://host:6379/0", or unset to disable the shared cache
+GENERATION_CACHE_URL = os.getenv("GENERATION_CACHE_URL", "")
+SQLITE_PURGE_EVERY = 100
+
+logger = logging.getLogger(__name__)
+
+
+class CacheError(Exception):
+    pass
+
+
+# Shared cache interface. Values are bytes; `ttl` is in seconds and None
+# means no expiry. add() stores only if the key is absent (or expired) and
+# returns whether it did, atomically across every process using the cache.
+class SharedCache(abc.ABC):
+    @abc.abstractmethod
+    def get(self, key):
+        pass
+
+    @abc.abstractmethod
+    def set(self, key, value, ttl=None):
+        pass
+
+    @abc.abstractmethod
+    def add(self, key, value, ttl=None):
+        pass
+
+    @abc.abstractmethod
+    def delete(self, key):
+        pass
+
+
+# Cache in a SQLite file that every replica can reach (same host or a shared
+# volume with working locks)
+class SQLiteCache(SharedCache):
+    def __init__(self, path):
+        self.path = path
+        self.sets = 0
+        try:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    expires_at REAL
+                ) WITHOUT ROWID
+            """)
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as exc:
+            raise CacheError(f"SQLite cache {path}: {exc}") from exc
+
+    def _execute(self, sql, parameters):
+        try:
+            conn = sqlite3.connect(self.path, timeout=30)
+            cursor = conn.cursor()
+            cursor.execute(sql, parameters)
+            row = cursor.fetchone()
+            changed = cursor.rowcount
+            conn.commit()
+            conn.close()
+            return row, changed
+        except sqlite3.Error as exc:
+            raise CacheError(f"SQLite cache {self.path}: {exc}") from exc
+
+    def _expires_at(self, ttl):
+        return None if ttl is None else time.time() + ttl
+
+    def get(self, key):
+        row, _ = self._execute("""
+            SELECT value FROM cache_entries
+            WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)
+        """, (key, time.time()))
+        return row[0] if row else None
+
+    def set(self, key, value, ttl=None):
+        self._execute("""
+            INSERT INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at
+        """, (key, value, self._expires_at(ttl)))
+        self.sets += 1
+        if self.sets % SQLITE_PURGE_EVERY == 0:
+            self._execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),))
+
+    # One statement, so two replicas can't both win: an existing entry is
+    # only overwritten when it has expired
+    def add(self, key, value, ttl=None):
+        now = time.time()
+        _, changed = self._execute("""
+            INSERT INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at
+            WHERE cache_entries.expires_at IS NOT NULL AND cache_entries.expires_at <= ?
+        """, (key, value, self._expires_at(ttl), now))
+        return changed == 1
+
+    def delete(self, key):
+        self._execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+
+def _encode_command(args):
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+    return b"".join(parts)
+
+def _read_reply(reader):
+    line = reader.readline()
+    if not line:
+        raise ConnectionError("connection closed")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode()
+    if kind == b"-":
+        raise CacheError(payload.decode())
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        length = int(payload)
+        return None if length < 0 else [_read_reply(reader) for _ in range(length)]
+    raise CacheError(f"Unexpected reply: {line!r}")
+
+
+# Cache on a Redis (or Redis-protocol compatible) server, spoken to directly
+# over RESP so no client library is needed. One connection, reopened once if
+# it drops.
+class RedisCache(SharedCache):
+    def __init__(self, host="127.0.0.1", port=6379, db=0, password=None, timeout=5.0, prefix="qgen:"):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self.prefix = prefix
+        self.sock = None
+        self.reader = None
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.reader = self.sock.makefile("rb")
+        if self.password:
+            self._send(["AUTH", self.password])
+        if self.db:
+            self._send(["SELECT", self.db])
+
+    def _close(self):
+        if self.sock is not None:
+            self.reader.close()
+            self.sock.close()
+        self.sock = self.reader = None
+
+    def _send(self, args):
+        self.sock.sendall(_encode_command(args))
+        return _read_reply(self.reader)
+
+    def _command(self, *args):
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    if self.sock is None:
+                        self._connect()
+                    return self._send(args)
+                except (OSError, ConnectionError) as exc:
+                    self._close()
+                    if attempt:
+                        raise CacheError(f"Redis cache {self.host}:{self.port}: {exc}") from exc
+
+    def _expiry(self, ttl):
+        return [] if ttl is None else ["PX", max(1, int(ttl * 1000))]
+
+    def get(self, key):
+        return self._command("GET", self.prefix + key)
+
+    def set(self, key, value, ttl=None):
+        self._command("SET", self.prefix + key, value, *self._expiry(ttl))
+
+    def add(self, key, value, ttl=None):
+        return self._command("SET", self.prefix + key, value, "NX", *self._expiry(ttl)) == "OK"
+
+    def delete(self, key):
+        self._command("DEL", self.prefix + key)
+
+
+# In-process stand-in for a Redis server, speaking the subset of RESP that
+# RedisCache uses (PING, GET, SET with EX/PX/NX/XX, DEL, FLUSHALL, SELECT,
+# AUTH). For tests and single-host setups without Redis.
+class LocalRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), _LocalRedisHandler)
+        self.store = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    # Serve from a daemon thread; returns self so it can be chained
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="local-redis", daemon=True).start()
+        return self
+
+    def _live(self, key, now):
+        entry = self.store.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            del self.store[key]
+            return None
+        return entry
+
+    def execute(self, args):
+        command = args[0].upper()
+        now = time.monotonic()
+        with self.lock:
+            if command == b"PING":
+                return "+PONG"
+            if command in (b"SELECT", b"AUTH"):
+                return "+OK"
+            if command == b"FLUSHALL":
+                self.store.clear()
+                return "+OK"
+            if command == b"GET":
+                entry = self._live(args[1], now)
+                return None if entry is None else entry[0]
+            if command == b"DEL":
+                return sum(self.store.pop(key, None) is not None for key in args[1:])
+            if command == b"SET":
+                key, value, options = args[1], args[2], [option.upper() for option in args[3:]]
+                expires_at = None
+                if b"EX" in options:
+                    expires_at = now + int(options[options.index(b"EX") + 1])
+                if b"PX" in options:
+                    expires_at = now + int(options[options.index(b"PX") + 1]) / 1000
+                exists = self._live(key, now) is not None
+                if (b"NX" in options and exists) or (b"XX" in options and not exists):
+                    return None
+                self.store[key] = (value, expires_at)
+                return "+OK"
+        return f"-ERR unknown command '{command.decode(errors='replace')}'"
+
+
+class _LocalRedisHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                args = _read_reply(self.rfile)
+            except (ConnectionError, CacheError, ValueError):
+                return
+            reply = self.server.execute(args)
+            if reply is None:
+                data = b"$-1\r\n"
+            elif isinstance(reply, int):
+                data = f":{reply}\r\n".encode()
+            elif isinstance(reply, bytes):
+                data = f"${len(reply)}\r\n".encode() + reply + b"\r\n"
+            else:
+                data = reply.encode() + b"\r\n"
+            self.wfile.write(data)
+
+
+# Build a cache from a GENERATION_CACHE_URL-style URL
+def open_shared_cache(url):
+    parsed = urlparse(url)
+    if parsed.scheme == "sqlite":
+        return SQLiteCache(parsed.path[1:] if parsed.path.startswith("/") else parsed.path)
+    if parsed.scheme == "redis":
+        db = int(parsed.path.strip("/") or 0)
+        return RedisCache(parsed.hostname or "127.0.0.1", parsed.port or 6379, db, parsed.password)
+    raise ValueError(f"Unsupported cache URL: {url}")
+
+# Key for one logical model call: the same prompt to the same model
+def cache_key(model, prompt):
+    payload = json.dumps([model, prompt])
+    return "generation:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+_cache = None
+_cache_failed = False
+_cache_lock = threading.Lock()
+
+# The process-wide shared cache, or None when GENERATION_CACHE_URL is unset
+# or can't be opened (logged once; calls then just aren't shared)
+def get_shared_cache():
+    global _cache, _cache_failed
+    with _cache_lock:
+        if _cache is None and GENERATION_CACHE_URL and not _cache_failed:
+            try:
+                _cache = open_shared_cache(GENERATION_CACHE_URL)
+            except (CacheError, ValueError):
+                _cache_failed = True
+                logger.exception("Shared cache %s is unavailable; model calls won't be shared", GENERATION_CACHE_URL)
+        return _cache
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local Redis-protocol stand-in for the shared cache")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+
+    server = LocalRedisServer(args.host, args.port)
+    print(f"Serving {server.url}; set GENERATION_CACHE_URL to it")
+    server.serve_forever()
@@ -0,0 +1,173 @@
+import argparse
+import os
+import shutil
+import sqlite3
+import stat
+import time
+import numpy as np
+import pyarrow as pa
+from question_bank import DB_PATH
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+# Pages copied per backup step; writers can commit between steps
+SNAPSHOT_PAGES_PER_STEP = int(os.getenv("SNAPSHOT_PAGES_PER_STEP", "1024"))
+SNAPSHOT_ROWS_PER_BATCH = 1 << 20
+SNAPSHOT_DB_NAME = "bank.sqlite"
+SNAPSHOT_COLUMNS_NAME = "questions.arrow"
+# Memory-map up to this many bytes of a snapshot database
+SNAPSHOT_MMAP_SIZE = 1 << 34
+
+# One row per question with the fields analytics look at; lengths and counts
+# are computed once here so readers get plain numeric columns
+COLUMNS_SQL = """
+    SELECT
+        id, subject, level, question_type,
+        LENGTH(question),
+        (COALESCE(option_a, '') != '') + (COALESCE(option_b, '') != '') +
+        (COALESCE(option_c, '') != '') + (COALESCE(option_d, '') != ''),
+        LENGTH(correct_answer) - LENGTH(REPLACE(correct_answer, ',', '')) + 1,
+        created_at,
+        served_at IS NOT NULL
+    FROM questions
+    ORDER BY id
+"""
+COLUMNS_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("subject", pa.string()),
+    ("level", pa.string()),
+    ("question_type", pa.string()),
+    ("question_length", pa.int32()),
+    ("option_count", pa.int8()),
+    ("answer_count", pa.int8()),
+    ("created_at", pa.float64()),
+    ("served", pa.int8())
+])
+
+
+def _make_read_only(path):
+    os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+# Write the question columns of a snapshot database as an Arrow IPC file,
+# one record batch at a time
+def _write_columns(db_path, columns_path):
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro&immutable=1", uri=True)
+    cursor = conn.cursor()
+    cursor.execute(COLUMNS_SQL)
+    with pa.OSFile(columns_path, "wb") as sink, pa.ipc.new_file(sink, COLUMNS_SCHEMA) as writer:
+        while True:
+            rows = cursor.fetchmany(SNAPSHOT_ROWS_PER_BATCH)
+            if not rows:
+                break
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(zip(*rows), COLUMNS_SCHEMA)],
+                schema=COLUMNS_SCHEMA
+            ))
+    conn.close()
+
+# Point-in-time copy of the live bank through the SQLite online backup API.
+# The live database is only read, in short steps, so teachers' writes are
+# never blocked for long. Returns the new snapshot directory.
+def create_snapshot(snapshot_dir=SNAPSHOT_DIR, db_path=DB_PATH):
+    now = time.time()
+    name = time.strftime("bank-%Y%m%d-%H%M%S", time.localtime(now)) + f"-{int(now * 1000) % 1000:03d}"
+    target = os.path.join(snapshot_dir, name)
+    staging = os.path.join(snapshot_dir, f".{name}.tmp")
+    os.makedirs(staging)
+    try:
+        snapshot_db = os.path.join(staging, SNAPSHOT_DB_NAME)
+        source = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        # A small cache so the copy doesn't hold on to memory the app could use
+        source.execute("PRAGMA cache_size = -2048")
+        destination = sqlite3.connect(snapshot_db)
+        source.backup(destination, pages=SNAPSHOT_PAGES_PER_STEP)
+        destination.close()
+        source.close()
+
+        _write_columns(snapshot_db, os.path.join(staging, SNAPSHOT_COLUMNS_NAME))
+        for file_name in os.listdir(staging):
+            _make_read_only(os.path.join(staging, file_name))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    # Publish the finished snapshot in one step
+    os.rename(staging, target)
+    return target
+
+# Snapshot directories, newest first
+def list_snapshots(snapshot_dir=SNAPSHOT_DIR):
+    if not os.path.isdir(snapshot_dir):
+        return []
+    names = sorted((name for name in os.listdir(snapshot_dir) if name.startswith("bank-")), reverse=True)
+    return [os.path.join(snapshot_dir, name) for name in names]
+
+def prune_snapshots(keep, snapshot_dir=SNAPSHOT_DIR):
+    for path in list_snapshots(snapshot_dir)[keep:]:
+        for file_name in os.listdir(path):
+            os.chmod(os.path.join(path, file_name), stat.S_IRUSR | stat.S_IWUSR)
+        shutil.rmtree(path)
+
+# Read-only connection to a snapshot's database. immutable=1 skips all file
+# locking, and pages are read through a memory map instead of SQLite's cache.
+def open_snapshot_db(path):
+    conn = sqlite3.connect(f"file:{os.path.join(path, SNAPSHOT_DB_NAME)}?mode=ro&immutable=1", uri=True)
+    conn.execute(f"PRAGMA mmap_size = {SNAPSHOT_MMAP_SIZE}")
+    return conn
+
+# The snapshot's question columns as a memory-mapped Arrow table; nothing is
+# read from disk until a column is used
+def load_columns(path):
+    source = pa.memory_map(os.path.join(path, SNAPSHOT_COLUMNS_NAME), "r")
+    return pa.ipc.open_file(source).read_all()
+
+# A numeric column as NumPy: a view onto the memory map (no copy) while the
+# bank fits in one record batch, otherwise the batches joined into one array
+def numeric_column(table, name):
+    chunks = table.column(name).chunks
+    if len(chunks) == 1:
+        return chunks[0].to_numpy(zero_copy_only=True)
+    return np.concatenate([chunk.to_numpy(zero_copy_only=True) for chunk in chunks])
+
+# Length percentiles and option/answer count distributions per question type
+def summarize(path):
+    table = load_columns(path)
+    if table.num_rows == 0:
+        return {}
+    question_types = table.column("question_type").to_numpy(zero_copy_only=False)
+    lengths = numeric_column(table, "question_length")
+    option_counts = numeric_column(table, "option_count")
+    answer_counts = numeric_column(table, "answer_count")
+    summary = {}
+    for question_type in np.unique(question_types):
+        mask = question_types == question_type
+        type_lengths = lengths[mask]
+        summary[str(question_type)] = {
+            "questions": int(mask.sum()),
+            "length_p50": float(np.percentile(type_lengths, 50)),
+            "length_p90": float(np.percentile(type_lengths, 90)),
+            "length_max": int(type_lengths.max()),
+            "option_counts": {int(count): int(n) for count, n in zip(*np.unique(option_counts[mask], return_counts=True))},
+            "answer_counts": {int(count): int(n) for count, n in zip(*np.unique(answer_counts[mask], return_counts=True))}
+        }
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read-only snapshots of the question bank for analytics")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    create_parser = subparsers.add_parser("create", help="snapshot the live bank")
+    create_parser.add_argument("--keep", type=int, default=0, help="delete all but the newest KEEP snapshots")
+    summary_parser = subparsers.add_parser("summary", help="column statistics of a snapshot")
+    summary_parser.add_argument("path", nargs="?", help="snapshot directory (default: newest)")
+    args = parser.parse_args()
+
+    if args.command == "create":
+        print(create_snapshot())
+        if args.keep:
+            prune_snapshots(args.keep)
+    else:
+        snapshots = list_snapshots()
+        path = args.path or (snapshots[0] if snapshots else None)
+        if path is None:
+            parser.error("no snapshots yet; run 'python snapshots.py create' first")
+        for question_type, stats in summarize(path).items():
+            print(f"{question_type}: {stats}")
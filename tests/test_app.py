@@ -0,0 +1,33 @@
+import os
+import streamlit as st
+import generator
+import prewarm
+from questions import make_question
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+def logged_in_app(monkeypatch):
+    # Storage setup is cached per process; every test has its own database
+    st.cache_resource.clear()
+    monkeypatch.setattr(prewarm, "PREWARM_ENABLED", False)
+    monkeypatch.setattr(prewarm, "_worker", None)
+    app = AppTest.from_file(APP_PATH, default_timeout=60).run()
+    app.text_input[0].input("admin")
+    app.text_input[1].input("1234")
+    app.button[0].click().run()
+    return app
+
+
+def test_repeated_questions_are_shown_once(workdir, monkeypatch):
+    question = make_question("MCQs", "Which letter comes first?", ("a", "b", "c", "d"), "a")
+    monkeypatch.setattr(generator, "serve_questions", lambda *args, **kwargs: [question, question])
+    app = logged_in_app(monkeypatch)
+    app.text_input(key="new_subject").input("Letters").run()
+    app.button(key="save_subject").click().run()
+    app.text_input(key="new_level").input("Bronze").run()
+    app.button(key="save_level").click().run()
+    app.button(key="FormSubmitter:generate_form-Generate Questions").click().run()
+    assert not app.exception
+    assert [box.label for box in app.checkbox if (box.key or "").startswith("gen_q_")] == ["1 . Which letter comes first?"]
@@ -0,0 +1,22 @@
+import generator
+from chunk_planner import MODEL_OUTPUT_LIMIT
+
+
+def capture_budget(monkeypatch, plans):
+    budgets = []
+    monkeypatch.setattr(generator, "plan_chunks", lambda question_type, count: plans[question_type])
+    monkeypatch.setattr(generator, "call_model", lambda prompt, generation_config=None: budgets.append(
+        generation_config["max_output_tokens"]) or "")
+    return budgets
+
+
+def test_batch_budget_covers_every_planned_chunk(monkeypatch):
+    budgets = capture_budget(monkeypatch, {"MCQs": [(10, 1000), (5, 500)], "True/False": [(3, 200)]})
+    generator._generate_batch_call([("Math", "Bronze", "MCQs", 15), ("Math", "Bronze", "True/False", 3)])
+    assert budgets == [1700]
+
+
+def test_batch_budget_is_capped_at_the_model_limit(monkeypatch):
+    budgets = capture_budget(monkeypatch, {"MCQs": [(10, MODEL_OUTPUT_LIMIT), (10, MODEL_OUTPUT_LIMIT)]})
+    generator._generate_batch_call([("Math", "Bronze", "MCQs", 20), ("Physics", "Bronze", "MCQs", 20)])
+    assert budgets == [MODEL_OUTPUT_LIMIT]
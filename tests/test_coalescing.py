@@ -0,0 +1,71 @@
+import threading
+import time
+import pytest
+import generator
+from cancellation import CancelToken, GenerationCancelled
+from questions import make_question
+
+
+@pytest.fixture
+def generate(monkeypatch):
+    calls = []
+    release = threading.Event()
+
+    def slow_generate(subject, number, level, question_type):
+        calls.append(subject)
+        release.wait(5)
+        generator.current_context().poll(0)
+        return [make_question("True/False", f"{subject} {i}?", answer="True") for i in range(number)]
+    monkeypatch.setattr(generator, "generate_planned_questions", slow_generate)
+    monkeypatch.setattr(generator, "POLL_SECONDS", 0.01)
+    return calls, release
+
+
+def run(results, name, subject="Math", cancel=None):
+    def target():
+        try:
+            with generator.generation_context(cancel=cancel):
+                results[name] = generator.generate_parsed_questions(subject, 2, "Bronze", "True/False")
+        except GenerationCancelled as exc:
+            results[name] = exc
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread
+
+
+def wait_for_flights(count):
+    while len(generator._flights) < count:
+        time.sleep(0.01)
+
+
+def test_identical_requests_share_one_call(generate):
+    calls, release = generate
+    results = {}
+    threads = [run(results, "first")]
+    wait_for_flights(1)
+    threads += [run(results, "second"), run(results, "other", subject="Physics")]
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert sorted(calls) == ["Math", "Physics"]
+    assert results["first"] == results["second"]
+    # Each caller gets its own list
+    assert results["first"] is not results["second"]
+
+
+def test_waiter_takes_over_from_a_cancelled_leader(generate):
+    calls, release = generate
+    results = {}
+    cancel = CancelToken()
+    leader = run(results, "leader", cancel=cancel)
+    wait_for_flights(1)
+    waiter = run(results, "waiter")
+    time.sleep(0.05)
+    cancel.cancel()
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+    assert isinstance(results["leader"], GenerationCancelled)
+    assert len(results["waiter"]) == 2
+    assert calls == ["Math", "Math"]
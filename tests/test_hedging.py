@@ -0,0 +1,97 @@
+import threading
+import time
+import pytest
+from hedging import CircuitBreaker, CircuitOpen, HedgeBudget, LatencyTracker, release_once, run_hedged
+
+
+def test_breaker_opens_after_enough_failures():
+    breaker = CircuitBreaker(window=4, min_calls=4, error_rate=0.5, cooldown=10)
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+
+
+def test_half_open_trial_decides():
+    breaker = CircuitBreaker(window=2, min_calls=2, error_rate=0.5, cooldown=0.3)
+    breaker.record_failure()
+    breaker.record_failure()
+    time.sleep(0.35)
+    assert breaker.state == "half-open"
+    breaker.allow()
+    # Only one trial at a time
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    time.sleep(0.35)
+    breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.allow()
+
+
+def test_a_trial_that_never_reports_back_stops_blocking():
+    breaker = CircuitBreaker(window=1, min_calls=1, error_rate=1.0, cooldown=0.3)
+    breaker.record_failure()
+    time.sleep(0.35)
+    breaker.allow()
+    time.sleep(0.35)
+    breaker.allow()
+
+
+def test_deadline_needs_samples_and_has_a_floor():
+    tracker = LatencyTracker(window=10, quantile=0.9, min_samples=5, min_delay=0.5)
+    for seconds in (0.1, 0.2, 0.3, 0.4):
+        tracker.record("key", seconds)
+    assert tracker.deadline("key") is None
+    tracker.record("key", 2.0)
+    assert tracker.deadline("key") == 2.0
+    tracker = LatencyTracker(window=10, quantile=0.9, min_samples=1, min_delay=0.5)
+    tracker.record("key", 0.1)
+    assert tracker.deadline("key") == 0.5
+
+
+def test_hedge_budget_is_earned_by_calls():
+    budget = HedgeBudget(ratio=0.5, burst=1.0)
+    assert budget.spend()
+    assert not budget.spend()
+    budget.earn()
+    assert not budget.spend()
+    budget.earn()
+    assert budget.spend()
+
+
+def test_release_once():
+    released = []
+    release = release_once(lambda: released.append(True))
+    release()
+    release()
+    assert released == [True]
+
+
+def test_slow_call_is_hedged_and_the_fast_copy_wins():
+    attempts = []
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            attempts.append(True)
+            first = len(attempts) == 1
+        time.sleep(1.0 if first else 0.01)
+        return "slow" if first else "fast"
+    released = []
+    result, hedged = run_hedged(call, 0.05, lambda: lambda: released.append("hedge"),
+                                lambda: released.append("primary"))
+    assert (result, hedged) == ("fast", True)
+    time.sleep(0.05)
+    assert released == ["hedge"]
+
+
+def test_no_hedge_without_capacity():
+    result, hedged = run_hedged(lambda: time.sleep(0.1) or "only", 0.01, lambda: None, lambda: None)
+    assert (result, hedged) == ("only", False)
@@ -0,0 +1,31 @@
+import sqlite3
+from exporter import write_csv
+from importer import import_csv_files
+from questions import make_question
+
+
+def make_questions(count):
+    return [make_question("MCQs", f"What is {i}?", ["a", "b", "c", "d"], "a") for i in range(count)]
+
+
+def write_export(path, questions, variants=1):
+    with open(path, "w", newline="", encoding="utf-8") as csv_file:
+        write_csv(csv_file, questions, "Math", "Easy", variants=variants)
+
+
+def test_imported_questions_are_marked_served(workdir):
+    write_export("export.csv", make_questions(3))
+    assert import_csv_files(["export.csv"], workers=1) == (3, 0)
+    conn = sqlite3.connect("questions_db.sqlite")
+    rows = conn.execute("SELECT served_at = created_at FROM questions").fetchall()
+    conn.close()
+    assert rows == [(1,)] * 3
+
+
+def test_only_the_first_variant_is_imported(workdir):
+    write_export("export.csv", make_questions(4), variants=3)
+    assert import_csv_files(["export.csv"], workers=1) == (4, 0)
+    conn = sqlite3.connect("questions_db.sqlite")
+    texts = sorted(text for (text,) in conn.execute("SELECT question FROM questions"))
+    conn.close()
+    assert texts == sorted(question.text for question in make_questions(4))
@@ -0,0 +1,49 @@
+import asyncio
+import time
+import async_generator
+import generator
+
+
+class SlowScheduler:
+    def release(self, ticket):
+        pass
+
+
+def slow_slot(context):
+    time.sleep(0.3)
+    return object()
+
+
+def test_planner_gets_model_latency_not_queueing(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(generator.planner, "record", lambda *args: recorded.append(args[-1]))
+    monkeypatch.setattr(generator, "plan_chunks", lambda question_type, number: [(number, 512)])
+    monkeypatch.setattr(generator, "get_shared_cache", lambda: None)
+    monkeypatch.setattr(generator, "scheduler", SlowScheduler())
+    monkeypatch.setattr(generator, "_acquire_model_slot", slow_slot)
+    monkeypatch.setattr(generator, "_call_once", lambda prompt, generation_config, cancel=None: (
+        "1. Is the sky blue?\nCorrect Answer: [True]", 0.05))
+    questions = []
+    generator._fill_questions(questions, "Science", 1, "Bronze", "True/False")
+    assert len(questions) == 1
+    assert recorded == [0.05]
+
+
+def test_async_planner_gets_model_latency_not_queueing(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(async_generator, "parse_chunk", lambda text, question_type, chunk, elapsed: recorded.append(elapsed) or [])
+
+    async def slow_acquire(*args, **kwargs):
+        await asyncio.sleep(0.3)
+    monkeypatch.setattr(async_generator.scheduler, "acquire_async", slow_acquire)
+    monkeypatch.setattr(async_generator.scheduler, "release", lambda ticket: None)
+
+    class Player:
+        def next_entry(self, prompt):
+            return {"text": ""}
+
+        def delay(self, entry):
+            return 0.05
+    monkeypatch.setattr(async_generator, "get_player", lambda: Player())
+    asyncio.run(async_generator._generate_chunk(asyncio.Semaphore(1), "Science", 1, "Bronze", "True/False", 512, None))
+    assert len(recorded) == 1 and 0.05 <= recorded[0] < 0.2
@@ -0,0 +1,29 @@
+import generator
+import prewarm
+from scheduler import BACKGROUND, FairScheduler
+from questions import make_question
+
+
+def test_every_model_call_of_a_refill_counts_against_the_budget(workdir, monkeypatch):
+    def generate(subject, number, level, question_type):
+        # Three chunks' worth of calls for one refill
+        generator.current_context().calls += 3
+        return [make_question("True/False", f"Fact {i}?", answer="True") for i in range(number)]
+    monkeypatch.setattr(prewarm, "generate_planned_questions", generate)
+    prewarm.init_bank()
+    worker = prewarm.PrewarmWorker(target=10, chunk=5, idle_seconds=0, quota_share=1.0, requests_per_minute=4)
+    worker.record_request("Math", "Bronze", "True/False")
+    assert worker.refill_once()
+    assert len(worker.recent_calls) == 3
+    assert worker.refill_once()
+    # The budget of 4 calls a minute is now used up
+    assert not worker.refill_once()
+
+
+def test_generation_context_counts_model_calls(workdir, monkeypatch):
+    monkeypatch.setattr(generator, "scheduler", FairScheduler(path=str(workdir / "scheduler_state.sqlite")))
+    monkeypatch.setattr(generator, "_call_once", lambda prompt, generation_config, cancel=None: ("text", 0.5))
+    with generator.generation_context(priority=BACKGROUND) as context:
+        generator.call_model("first")
+        generator.call_model("second")
+    assert context.calls == 2
@@ -0,0 +1,25 @@
+import os
+from profiling import RerunProfiler
+
+
+def test_armed_reruns_are_saved(tmp_path):
+    profiler = RerunProfiler(str(tmp_path))
+    profiler.arm(1)
+    with profiler.profile_rerun():
+        sum(range(1000))
+    with profiler.profile_rerun():
+        pass
+    assert sorted(os.path.splitext(name)[1] for name in os.listdir(tmp_path)) == [".collapsed", ".pstats"]
+
+
+def test_fragment_inside_a_profiled_rerun_is_part_of_it(tmp_path):
+    profiler = RerunProfiler(str(tmp_path))
+    profiler.arm(2)
+    with profiler.profile_rerun():
+        with profiler.profile_rerun():
+            pass
+    assert len(os.listdir(tmp_path)) == 2
+    # The fragment didn't use up the second armed rerun
+    with profiler.profile_rerun():
+        pass
+    assert len(os.listdir(tmp_path)) == 4
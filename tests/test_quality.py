@@ -0,0 +1,41 @@
+from quality import check_question, validate_questions
+from questions import make_question
+
+
+def mcq(text="What is 2 + 2?", options=("3", "4", "5", "6"), answer="b"):
+    return make_question("MCQs", text, options, answer)
+
+
+def test_good_questions_pass():
+    question, reason = check_question(mcq())
+    assert reason is None
+    assert question == mcq()
+
+
+def test_markdown_emphasis_is_stripped():
+    question, reason = check_question(mcq(text="**What is 2 + 2?**", options=("3", "*4*", "5", "6")))
+    assert reason is None
+    assert question.text == "What is 2 + 2?"
+    assert question.b == "4"
+
+
+def test_broken_questions_are_rejected():
+    assert check_question(mcq(text="Question?"))[1] == "placeholder stem"
+    assert check_question(mcq(options=("3", "", "5", "6")))[1] == "empty option"
+    assert check_question(mcq(options=("Option 1", "4", "5", "6")))[1] == "placeholder option"
+    assert check_question(mcq(options=("4", "4", "5", "6")))[1] == "duplicate options"
+    assert check_question(mcq(answer="b, c"))[1] == "invalid answer"
+    assert check_question(make_question("True/False", "Is 2 + 2 four?", answer="Yes"))[1] == "invalid answer"
+
+
+def test_multiple_answers_are_normalised():
+    question, reason = check_question(make_question("Multiple Correct Answers", "Which are even?",
+                                                    ("1", "2", "3", "4"), "d, b, d"))
+    assert reason is None
+    assert question.answer == "b, d"
+
+
+def test_validate_questions_drops_and_counts_rejects():
+    accepted, rejected = validate_questions([mcq(), mcq(text="..."), mcq(answer="b, c")])
+    assert accepted == [mcq()]
+    assert rejected == {"placeholder stem": 1, "invalid answer": 1}
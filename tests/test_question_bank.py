@@ -0,0 +1,59 @@
+import pytest
+import generator
+import question_bank
+from cancellation import GenerationCancelled
+from questions import make_question
+
+
+def facts(prefix, count):
+    return [make_question("True/False", f"{prefix} fact {i}?", answer="True") for i in range(count)]
+
+
+def stats():
+    return {(row["subject"], row["question_type"]): (row["total"], row["fresh"]) for row in question_bank.fetch_bank_stats()}
+
+
+@pytest.fixture
+def bank(workdir):
+    question_bank.init_bank()
+
+
+def test_take_questions_marks_them_served(bank):
+    question_bank.store_questions("Math", "Bronze", "True/False", facts("Math", 5))
+    ids, questions = question_bank.take_questions("Math", "Bronze", "True/False", 3)
+    assert len(ids) == len(questions) == 3
+    assert stats() == {("Math", "True/False"): (5, 2)}
+    question_bank.restock_questions(ids)
+    assert stats() == {("Math", "True/False"): (5, 5)}
+
+
+def test_cancelled_request_puts_its_stock_back(bank, monkeypatch):
+    question_bank.store_questions("Math", "Bronze", "True/False", facts("Math", 5))
+
+    def cancelled(*args):
+        raise GenerationCancelled("Generation was cancelled.")
+    monkeypatch.setattr(generator, "generate_parsed_questions", cancelled)
+    with pytest.raises(GenerationCancelled):
+        generator.serve_questions("Math", 8, "Bronze", "True/False")
+    # The same five rows are fresh again; nothing was inserted twice
+    assert stats() == {("Math", "True/False"): (5, 5)}
+    ids, questions = question_bank.take_questions("Math", "Bronze", "True/False", 10)
+    assert len({question.text for question in questions}) == 5
+
+
+def test_fresh_questions_repeating_stock_are_dropped(bank, monkeypatch):
+    question_bank.store_questions("Math", "Bronze", "True/False", facts("Math", 2))
+    monkeypatch.setattr(generator, "generate_parsed_questions", lambda *args: facts("Math", 3))
+    questions = generator.serve_questions("Math", 5, "Bronze", "True/False")
+    assert [question.text for question in questions] == [f"Math fact {i}?" for i in range(3)]
+
+
+def test_sampling_is_not_skewed_by_other_strata_between_ids(bank):
+    question_bank.store_questions("Chemistry", "Silver", "True/False", facts("Early chemistry", 100))
+    question_bank.store_questions("Physics", "Silver", "True/False", facts("Physics", 20000))
+    question_bank.store_questions("Chemistry", "Silver", "True/False", facts("Late chemistry", 100))
+    for seed in range(5):
+        quiz_id, sampled = question_bank.sample_quiz([("Chemistry", "Silver", "True/False", 10)],
+                                                     exclude_last=0, rng=question_bank.random.Random(seed))
+        assert len({question_id for question_id, _ in sampled}) == 10
+        assert all("chemistry" in question.text for _, question in sampled)
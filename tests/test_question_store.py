@@ -0,0 +1,33 @@
+from question_store import QuestionStore, question_size
+from questions import make_question
+
+
+def make_questions(prefix, count):
+    return [make_question("MCQs", f"{prefix} {i}?", ["a", "b", "c", "d"], "a") for i in range(count)]
+
+
+def test_identical_questions_share_an_entry():
+    store = QuestionStore()
+    question = make_questions("Same", 1)[0]
+    assert store.add([question]) == store.add([question])
+
+
+def test_unreferenced_entries_are_evicted_first():
+    pinned, loose = make_questions("Pinned", 5), make_questions("Loose", 5)
+    store = QuestionStore(max_bytes=sum(question_size(q) for q in pinned + loose))
+    pinned_ids = store.add(pinned, acquire=True)
+    loose_ids = store.add(loose)
+    store.add(make_questions("New", 2), acquire=True)
+    assert len(store.get(pinned_ids)) == 5
+    assert len(store.get(loose_ids)) < 5
+
+
+def test_new_questions_survive_a_store_full_of_stale_references():
+    stale = make_questions("Stale", 10)
+    store = QuestionStore(max_bytes=sum(question_size(q) for q in stale))
+    stale_ids = store.add(stale, acquire=True)
+    new_ids = store.add(make_questions("New", 3), acquire=True)
+    assert len(store.get(new_ids)) == 3
+    # The least recently used stale entries made room
+    assert store.get(stale_ids[:3]) == []
+    assert len(store.get(stale_ids[3:])) == 7
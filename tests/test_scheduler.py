@@ -0,0 +1,195 @@
+import asyncio
+import threading
+import time
+import pytest
+import scheduler as scheduler_module
+from scheduler import BACKGROUND, BATCH, INTERACTIVE, FairScheduler
+
+
+@pytest.fixture
+def state_path(tmp_path):
+    return str(tmp_path / "scheduler_state.sqlite")
+
+
+def make_scheduler(state_path, **options):
+    options.setdefault("slots", 2)
+    options.setdefault("reserved_slots", 0)
+    options.setdefault("aging_seconds", 0)
+    return FairScheduler(path=state_path, **options)
+
+
+# Queue acquire() calls in order and record the order slots are granted in
+def run_in_order(scheduler, requests):
+    granted = []
+    threads = []
+    for user, priority in requests:
+        thread = threading.Thread(target=lambda user=user, priority=priority: granted.append(
+            (user, scheduler.acquire(user, cost=0.0, priority=priority))))
+        thread.start()
+        threads.append(thread)
+        while scheduler.queue_length() < len(threads):
+            time.sleep(0.01)
+    return granted, threads
+
+
+def release_in_turn(scheduler, granted, threads, count):
+    order = []
+    for _ in range(count):
+        while len(granted) <= len(order):
+            time.sleep(0.01)
+        user, ticket = granted[len(order)]
+        order.append(user)
+        scheduler.release(ticket)
+    for thread in threads:
+        thread.join(5)
+    return order
+
+
+def test_slots_are_limited(state_path):
+    scheduler = make_scheduler(state_path)
+    first, second = scheduler.try_acquire("a", cost=0.0), scheduler.try_acquire("b", cost=0.0)
+    assert first and second
+    assert scheduler.try_acquire("c", cost=0.0) is None
+    scheduler.release(first)
+    assert scheduler.try_acquire("c", cost=0.0) is not None
+
+
+def test_more_urgent_classes_go_first(state_path):
+    scheduler = make_scheduler(state_path, slots=1)
+    running = scheduler.acquire("holder", cost=0.0)
+    granted, threads = run_in_order(scheduler, [("background", BACKGROUND), ("batch", BATCH), ("interactive", INTERACTIVE)])
+    scheduler.release(running)
+    assert release_in_turn(scheduler, granted, threads, 3) == ["interactive", "batch", "background"]
+
+
+def test_heavy_user_queues_behind_light_ones(state_path):
+    scheduler = make_scheduler(state_path, slots=1)
+    running = scheduler.acquire("heavy", cost=0.0)
+    granted, threads = run_in_order(scheduler, [("heavy", BATCH), ("heavy", BATCH), ("light", BATCH)])
+    scheduler.release(running)
+    assert release_in_turn(scheduler, granted, threads, 3) == ["light", "heavy", "heavy"]
+
+
+def test_reserved_slots_are_kept_for_interactive_work(state_path):
+    scheduler = make_scheduler(state_path, reserved_slots=1)
+    assert scheduler.try_acquire(None, cost=0.0, priority=BATCH) is not None
+    assert scheduler.try_acquire(None, cost=0.0, priority=BATCH) is None
+    assert scheduler.try_acquire(None, cost=0.0, priority=INTERACTIVE) is not None
+
+
+def test_waiting_work_ages_into_a_more_urgent_class(state_path):
+    scheduler = make_scheduler(state_path, aging_seconds=0.1)
+    ticket = scheduler._enqueue(None, 1.0, 0.0, BACKGROUND)
+    assert scheduler._effective_priority(ticket, time.monotonic()) == BACKGROUND
+    time.sleep(0.25)
+    assert scheduler._effective_priority(ticket, time.monotonic()) == INTERACTIVE
+
+
+def test_slots_are_shared_between_processes(state_path):
+    app, worker = make_scheduler(state_path), make_scheduler(state_path)
+    assert app.try_acquire(None, cost=0.0) is not None
+    assert worker.try_acquire(None, cost=0.0) is not None
+    assert app.try_acquire(None, cost=0.0) is None
+    assert worker.try_acquire(None, cost=0.0) is None
+
+
+def test_interactive_work_waiting_elsewhere_holds_back_batch_work(state_path):
+    app, worker = make_scheduler(state_path, slots=1), make_scheduler(state_path, slots=1)
+    running = app.acquire("holder", cost=0.0)
+    granted, threads = run_in_order(app, [("interactive", INTERACTIVE)])
+    # Give the app's waiter a poll to publish itself
+    time.sleep(0.1)
+    app.release(running)
+    assert worker.try_acquire(None, cost=0.0, priority=BATCH) is None
+    threads[0].join(5)
+    assert granted[0][0] == "interactive"
+    app.release(granted[0][1])
+    assert worker.try_acquire(None, cost=0.0, priority=BATCH) is not None
+
+
+def test_rate_buckets_are_shared_between_processes(state_path):
+    app = make_scheduler(state_path, slots=10, burst=2, requests_per_minute=0.001)
+    worker = make_scheduler(state_path, slots=10, burst=2, requests_per_minute=0.001)
+    assert app.try_acquire("alice") is not None
+    assert worker.try_acquire("alice") is not None
+    assert app.try_acquire("alice") is None
+    assert worker.try_acquire("alice") is None
+    # Other users and uncharged calls are unaffected
+    assert worker.try_acquire("bob") is not None
+    assert app.try_acquire("alice", cost=0.0) is not None
+
+
+def test_leases_of_dead_processes_expire(state_path, monkeypatch):
+    monkeypatch.setattr(scheduler_module, "LEASE_SECONDS", 0.5)
+    scheduler = make_scheduler(state_path, slots=1)
+    assert scheduler.try_acquire(None, cost=0.0) is not None
+    assert scheduler.try_acquire(None, cost=0.0) is None
+    time.sleep(0.6)
+    assert scheduler.try_acquire(None, cost=0.0) is not None
+
+
+def test_abandoned_waits_give_up_their_place(state_path):
+    scheduler = make_scheduler(state_path, slots=1)
+    running = scheduler.acquire(None, cost=0.0)
+
+    def give_up(position):
+        raise RuntimeError("gone")
+    with pytest.raises(RuntimeError):
+        scheduler.acquire(None, cost=0.0, on_wait=give_up)
+    assert scheduler.queue_length() == 0
+    scheduler.release(running)
+    assert scheduler.table.running() == 0
+
+
+def test_async_acquire_waits_for_a_slot(state_path, monkeypatch):
+    monkeypatch.setattr(scheduler_module, "WAIT_POLL_SECONDS", 0.01)
+    scheduler = make_scheduler(state_path, slots=1)
+    running = scheduler.acquire(None, cost=0.0)
+
+    async def main():
+        waiter = asyncio.ensure_future(scheduler.acquire_async(None, cost=0.0, priority=BATCH))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        scheduler.release(running)
+        return await asyncio.wait_for(waiter, 5)
+    scheduler.release(asyncio.run(main()))
+    assert scheduler.table.running() == 0
+
+
+def test_async_acquire_keeps_the_state_file_off_the_event_loop(state_path, monkeypatch):
+    scheduler = make_scheduler(state_path, slots=1)
+    loop_threads = set()
+    grant = scheduler.table.grant
+
+    def record_thread(*args):
+        loop_threads.add(threading.get_ident())
+        return grant(*args)
+    monkeypatch.setattr(scheduler.table, "grant", record_thread)
+
+    async def main():
+        ticket = await scheduler.acquire_async(None, cost=0.0, priority=BATCH)
+        await scheduler.release_async(ticket)
+        return threading.get_ident()
+    assert asyncio.run(main()) not in loop_threads
+    assert scheduler.table.running() == 0
+
+
+def test_cancelled_async_waiter_gives_up_its_place(state_path, monkeypatch):
+    monkeypatch.setattr(scheduler_module, "WAIT_POLL_SECONDS", 0.01)
+    scheduler = make_scheduler(state_path, slots=1)
+    running = scheduler.acquire(None, cost=0.0)
+
+    async def main():
+        waiter = asyncio.ensure_future(scheduler.acquire_async(None, cost=0.0, priority=BATCH))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+    asyncio.run(main())
+    assert scheduler.queue_length() == 0
+    scheduler.release(running)
+    assert scheduler.table.running() == 0
+
+
+def test_batch_capacity_leaves_out_reserved_slots(state_path):
+    assert make_scheduler(state_path, slots=4, reserved_slots=1).batch_capacity() == 3
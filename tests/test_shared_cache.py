@@ -0,0 +1,154 @@
+import threading
+import time
+import pytest
+import generator
+import shared_cache
+from scheduler import BACKGROUND
+from shared_cache import LocalRedisServer, SQLiteCache, open_shared_cache
+
+
+@pytest.fixture(scope="module")
+def redis_server():
+    server = LocalRedisServer().start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def cache(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteCache(str(tmp_path / "cache.sqlite"))
+    server = request.getfixturevalue("redis_server")
+    cache = open_shared_cache(server.url)
+    cache._command("FLUSHALL")
+    return cache
+
+
+def test_set_get_delete(cache):
+    assert cache.get("missing") is None
+    cache.set("key", b"value")
+    assert cache.get("key") == b"value"
+    cache.set("key", b"other")
+    assert cache.get("key") == b"other"
+    cache.delete("key")
+    assert cache.get("key") is None
+
+
+def test_add_only_when_absent(cache):
+    assert cache.add("key", b"first")
+    assert not cache.add("key", b"second")
+    assert cache.get("key") == b"first"
+
+
+def test_entries_expire(cache):
+    cache.set("key", b"value", ttl=0.5)
+    assert not cache.add("key", b"other", ttl=0.5)
+    time.sleep(0.6)
+    assert cache.get("key") is None
+    # An expired entry no longer blocks add
+    assert cache.add("key", b"other")
+    assert cache.get("key") == b"other"
+
+
+def test_one_add_wins_a_race(cache):
+    wins = []
+    barrier = threading.Barrier(8)
+
+    def contend(index):
+        barrier.wait()
+        if cache.add("race", str(index).encode(), ttl=10):
+            wins.append(index)
+    threads = [threading.Thread(target=contend, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(wins) == 1
+
+
+@pytest.fixture
+def shared(cache, monkeypatch):
+    monkeypatch.setattr(generator, "get_shared_cache", lambda: cache)
+    monkeypatch.setattr(generator, "POLL_SECONDS", 0.01)
+    return cache
+
+
+def test_waiter_gets_the_running_call_s_answer(shared, monkeypatch):
+    started, finish = threading.Event(), threading.Event()
+    calls = []
+
+    def slow_call(prompt, generation_config):
+        calls.append(prompt)
+        started.set()
+        finish.wait(5)
+        return "answer"
+    monkeypatch.setattr(generator, "_call_model", slow_call)
+
+    results = {}
+    leader = threading.Thread(target=lambda: results.setdefault("leader", generator.call_model("prompt", {"max_output_tokens": 100})))
+    leader.start()
+    started.wait(5)
+
+    def wait_for_answer():
+        results["waiter"] = generator.call_model("prompt", {"max_output_tokens": 200})
+        results["waiter_seconds"] = generator.last_model_seconds()
+    waiter = threading.Thread(target=wait_for_answer)
+    waiter.start()
+    time.sleep(0.1)
+    # The waiter is parked on the leader's lock, not calling the model
+    assert calls == ["prompt"]
+    finish.set()
+    leader.join(5)
+    waiter.join(5)
+    assert results == {"leader": "answer", "waiter": "answer", "waiter_seconds": None}
+    assert calls == ["prompt"]
+
+
+def test_finished_calls_are_not_reused(shared, monkeypatch):
+    answers = iter(["first", "second"])
+    monkeypatch.setattr(generator, "_call_model", lambda prompt, generation_config: next(answers))
+    assert generator.call_model("prompt") == "first"
+    assert generator.call_model("prompt") == "second"
+
+
+def test_waiter_takes_over_when_the_running_call_fails(shared, monkeypatch):
+    shared.add(generator.cache_key(generator.MODEL_NAME, "prompt") + ":lock", b"gone", ttl=0.1)
+    monkeypatch.setattr(generator, "_call_model", lambda prompt, generation_config: "own answer")
+    assert generator.call_model("prompt") == "own answer"
+
+
+def test_background_calls_bypass_the_cache(shared, monkeypatch):
+    shared.add(generator.cache_key(generator.MODEL_NAME, "prompt") + ":lock", b"held", ttl=10)
+    monkeypatch.setattr(generator, "_call_model", lambda prompt, generation_config: "background answer")
+    with generator.generation_context(priority=BACKGROUND):
+        assert generator.call_model("prompt") == "background answer"
+
+
+def test_shared_answers_are_not_recorded_in_the_planner(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(generator.planner, "record", lambda *args: recorded.append(args))
+    monkeypatch.setattr(generator, "plan_chunks", lambda question_type, number: [(number, 512)])
+    monkeypatch.setattr(generator, "last_model_seconds", lambda: None)
+    monkeypatch.setattr(generator, "call_model", lambda prompt, generation_config=None: "1. Is this shared?\nCorrect Answer: [True]")
+    questions = []
+    generator._fill_questions(questions, "Math", 1, "Bronze", "True/False")
+    assert len(questions) == 1
+    assert recorded == []
+
+
+@pytest.mark.parametrize("url", ["sqlite:///missing-dir/cache.sqlite", "memcached://localhost"])
+def test_a_broken_cache_url_means_no_sharing(url, workdir, monkeypatch, caplog):
+    monkeypatch.setattr(shared_cache, "GENERATION_CACHE_URL", url)
+    monkeypatch.setattr(shared_cache, "_cache", None)
+    monkeypatch.setattr(shared_cache, "_cache_failed", False)
+    monkeypatch.setattr(generator, "get_shared_cache", shared_cache.get_shared_cache)
+    monkeypatch.setattr(generator, "_call_model", lambda prompt, generation_config: "answer")
+    assert generator.call_model("prompt") == "answer"
+    assert generator.call_model("prompt") == "answer"
+    assert len([record for record in caplog.records if record.name == "shared_cache"]) == 1
+
+
+def test_shared_cache_is_abstract():
+    with pytest.raises(TypeError):
+        shared_cache.SharedCache()
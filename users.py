@@ -0,0 +1,146 @@
+import hashlib
+import hmac
+import os
+import secrets
+import sqlite3
+import time
+from question_bank import DB_PATH
+
+# Defaults for new accounts; 0 means unlimited
+DEFAULT_DAILY_QUESTION_QUOTA = int(os.getenv("DEFAULT_DAILY_QUESTION_QUOTA", "500"))
+DEFAULT_DAILY_TOKEN_QUOTA = int(os.getenv("DEFAULT_DAILY_TOKEN_QUOTA", "200000"))
+PASSWORD_ITERATIONS = 200000
+
+USER_COLUMNS = "username, department, weight, daily_question_quota, daily_token_quota, is_admin"
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+def hash_password(password, salt):
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), bytes.fromhex(salt), PASSWORD_ITERATIONS).hex()
+
+# User accounts setup
+def init_users():
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            password_hash TEXT NOT NULL,
+            salt TEXT NOT NULL,
+            department TEXT,
+            weight REAL NOT NULL DEFAULT 1.0,
+            daily_question_quota INTEGER NOT NULL,
+            daily_token_quota INTEGER NOT NULL,
+            is_admin INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_usage (
+            username TEXT NOT NULL,
+            day TEXT NOT NULL,
+            questions INTEGER NOT NULL DEFAULT 0,
+            tokens INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (username, day)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM users)")
+    has_users = cursor.fetchone()[0]
+    conn.commit()
+    conn.close()
+    # Keep the original admin login working on a fresh database
+    if not has_users:
+        create_user("admin", os.getenv("ADMIN_PASSWORD", "1234"), department="Administration",
+                    daily_question_quota=0, daily_token_quota=0, is_admin=True)
+
+def create_user(username, password, department=None, weight=1.0,
+                daily_question_quota=DEFAULT_DAILY_QUESTION_QUOTA,
+                daily_token_quota=DEFAULT_DAILY_TOKEN_QUOTA, is_admin=False):
+    salt = secrets.token_hex(16)
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO users (
+            username, password_hash, salt, department, weight,
+            daily_question_quota, daily_token_quota, is_admin, created_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (username, hash_password(password, salt), salt, department, weight,
+          daily_question_quota, daily_token_quota, int(is_admin), time.time()))
+    conn.commit()
+    conn.close()
+
+def _row_to_user(row):
+    username, department, weight, daily_question_quota, daily_token_quota, is_admin = row
+    return {
+        "username": username,
+        "department": department,
+        "weight": weight,
+        "daily_question_quota": daily_question_quota,
+        "daily_token_quota": daily_token_quota,
+        "is_admin": bool(is_admin)
+    }
+
+def fetch_user(username):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {USER_COLUMNS} FROM users WHERE username = ?", (username,))
+    row = cursor.fetchone()
+    conn.close()
+    return _row_to_user(row) if row else None
+
+def fetch_users():
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {USER_COLUMNS} FROM users ORDER BY department, username")
+    users = [_row_to_user(row) for row in cursor.fetchall()]
+    conn.close()
+    return users
+
+# Returns the user dict when the password matches, otherwise None
+def authenticate(username, password):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT password_hash, salt FROM users WHERE username = ?", (username,))
+    row = cursor.fetchone()
+    conn.close()
+    if row is None or not hmac.compare_digest(row[0], hash_password(password, row[1])):
+        return None
+    return fetch_user(username)
+
+def _today():
+    return time.strftime("%Y-%m-%d")
+
+# Returns (questions, tokens) used today
+def fetch_usage(username):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT questions, tokens FROM daily_usage WHERE username = ? AND day = ?", (username, _today()))
+    row = cursor.fetchone()
+    conn.close()
+    return row if row else (0, 0)
+
+def record_usage(username, questions, tokens):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO daily_usage (username, day, questions, tokens) VALUES (?, ?, ?, ?)
+        ON CONFLICT (username, day) DO UPDATE SET
+            questions = questions + excluded.questions,
+            tokens = tokens + excluded.tokens
+    """, (username, _today(), questions, tokens))
+    conn.commit()
+    conn.close()
+
+# Raise QuotaExceeded if `questions` more would go over the user's daily quotas
+def check_quota(user, questions):
+    used_questions, used_tokens = fetch_usage(user["username"])
+    question_quota = user["daily_question_quota"]
+    token_quota = user["daily_token_quota"]
+    if question_quota and used_questions + questions > question_quota:
+        raise QuotaExceeded(f"Daily question quota reached ({used_questions} of {question_quota} used).")
+    if token_quota and used_tokens >= token_quota:
+        raise QuotaExceeded(f"Daily token quota reached ({used_tokens} of {token_quota} used).")
@@ -0,0 +1,29 @@
+import random
+from questions import OPTION_LETTERS, QuestionType, make_question
+
+
+# Shuffle a question's options and remap its answer letters to match
+def shuffle_options(question, rng):
+    if question.qtype is QuestionType.TRUE_FALSE:
+        return question
+    order = list(range(len(OPTION_LETTERS)))
+    rng.shuffle(order)
+    options = (question.a, question.b, question.c, question.d)
+    # The option now in slot i came from slot order[i]
+    new_letter = {OPTION_LETTERS[old]: OPTION_LETTERS[new] for new, old in enumerate(order)}
+    letters = sorted(new_letter[letter] for letter in question.correct_letters)
+    return make_question(question.qtype, question.text, tuple(options[old] for old in order), ", ".join(letters))
+
+# One exam variant: question order and options shuffled, reproducible from
+# (seed, variant number)
+def make_variant(questions, seed, variant):
+    rng = random.Random(f"{seed}-{variant}")
+    shuffled = [shuffle_options(question, rng) for question in questions]
+    rng.shuffle(shuffled)
+    return shuffled
+
+# A single variant is the selection as-is; with more, every variant is shuffled
+def make_variants(questions, count, seed=0):
+    if count <= 1:
+        return [list(questions)]
+    return [make_variant(questions, seed, variant) for variant in range(1, count + 1)]